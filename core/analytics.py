@@ -0,0 +1,223 @@
+import os
+import pickle
+import contextlib
+import multiprocessing
+from array import array
+from typing import Dict, Iterator, List, Optional
+
+from core.replay import DeltaReplayReader, ENTITY_TYPES, load_replay
+from core.replayindex import ReplayIndex
+
+# 批量统计回放。每个回放先被转换为按列存放的数组（每bucket个回合一行），再合并为总的统计结果。
+# 回放的转换结果按回放的大小与修改时间缓存，重新统计时只需要处理新的回放。
+CACHE_VERSION = 1
+REPLAY_SUFFIXES = (".rpl", ".rpd")
+
+
+def _stamp(path: str) -> tuple:
+	stat = os.stat(path)
+	return stat.st_size, stat.st_mtime_ns
+
+
+def _iter_rounds(path: str) -> tuple:
+	if path.endswith(".rpd"):
+		reader = DeltaReplayReader(path)
+		return reader, reader.result, reader.iter_rounds()
+	try:
+		index = ReplayIndex(path, use_cache=False)
+	except Exception:  # 旧版本一次性写入的单行回放，只能整体读取
+		replay = load_replay(path)
+		result = {key: value for key, value in replay.items() if key not in ("map", "rounds")}
+		return contextlib.nullcontext(), result, iter(replay["rounds"])
+	return index, index.result, (index.get_round(n) for n in range(len(index)))
+
+
+# 将一个回放转换为按列存放的数组。每一行对应bucket个回合的平均值：
+# type_counts为各种类的实体数，team_energy为各队伍实体的总能量
+def replay_columns(path: str, bucket: int = 10) -> dict:
+	source, result, rounds = _iter_rounds(path)
+	with source:
+		players = len(result.get("teams", [])) or None
+		type_counts = array("d")
+		team_energy = array("d")
+		totals = [0] * len(ENTITY_TYPES)
+		energy = {}
+		n = 0
+		for n, entities in enumerate(rounds, 1):
+			for entity in entities:
+				totals[ENTITY_TYPES.index(entity["type"])] += 1
+				if entity["team"] != "Neutral":
+					energy[int(entity["team"])] = energy.get(int(entity["team"]), 0) + entity["energy"]
+			if n % bucket == 0:
+				players = _flush_bucket(type_counts, team_energy, totals, energy, bucket, players)
+		if n % bucket:
+			players = _flush_bucket(type_counts, team_energy, totals, energy, n % bucket, players)
+	return {"path": path, "rounds": n, "players": players or 0, "winner": result.get("winner"), "reason": result.get("reason"),
+		"teams": result.get("teams"), "actions": result.get("actions"), "type_counts": type_counts, "team_energy": team_energy}
+
+
+def _flush_bucket(type_counts: array, team_energy: array, totals: List[int], energy: Dict[int, int], size: int, players: Optional[int]) -> int:
+	if players is None:  # 没有记录队伍的旧回放，以第一个区间出现的队伍数为准
+		players = max(energy) + 1 if energy else 0
+	type_counts.extend(total / size for total in totals)
+	team_energy.extend(energy.get(i, 0) / size for i in range(players))
+	totals[:] = [0] * len(ENTITY_TYPES)
+	energy.clear()
+	return players
+
+
+def _analyze(args: tuple) -> tuple:
+	path, bucket = args
+	try:
+		return path, _stamp(path), replay_columns(path, bucket), None
+	except Exception as err:
+		return path, None, None, str(err)
+
+
+def empty_summary(bucket: int = 10) -> dict:
+	return {"bucket": bucket, "replays": 0, "rounds": 0, "reasons": {}, "winners": {}, "games": {}, "actions": {}, "action_replays": 0,
+		"type_counts": array("d"), "energy_total": array("d"), "energy_lead": array("d"), "samples": array("q"), "errors": {}}
+
+
+# 将一个回放的数组合并到统计结果中。曲线按区间累加，samples记录每个区间覆盖的回放数
+def merge_columns(summary: dict, columns: dict) -> None:
+	summary["replays"] += 1
+	summary["rounds"] += columns["rounds"]
+	reason = columns["reason"] or "unfinished"
+	summary["reasons"][reason] = summary["reasons"].get(reason, 0) + 1
+	if columns["winner"] is not None:
+		summary["winners"][columns["winner"]] = summary["winners"].get(columns["winner"], 0) + 1
+	for name in set(columns["teams"] or []):
+		summary["games"][name] = summary["games"].get(name, 0) + 1
+	if columns["actions"] is not None:
+		summary["action_replays"] += 1
+		for action, counts in columns["actions"].items():
+			summary["actions"][action] = summary["actions"].get(action, 0) + sum(counts)
+
+	types = len(ENTITY_TYPES)
+	players = columns["players"]
+	rows = len(columns["type_counts"]) // types
+	_grow(summary, rows)
+	for row in range(rows):
+		for i in range(types):
+			summary["type_counts"][row * types + i] += columns["type_counts"][row * types + i]
+		energy = columns["team_energy"][row * players:(row + 1) * players]
+		if energy:
+			summary["energy_total"][row] += sum(energy)
+			summary["energy_lead"][row] += max(energy) - min(energy)
+		summary["samples"][row] += 1
+
+
+def _grow(summary: dict, rows: int) -> None:
+	missing = rows - len(summary["samples"])
+	if missing > 0:
+		summary["type_counts"].extend([0.0] * (missing * len(ENTITY_TYPES)))
+		summary["energy_total"].extend([0.0] * missing)
+		summary["energy_lead"].extend([0.0] * missing)
+		summary["samples"].extend([0] * missing)
+
+
+# 合并两个统计结果，例如不同目录或者不同进程的部分结果
+def merge_summaries(summary: dict, other: dict) -> None:
+	if summary["bucket"] != other["bucket"]:
+		raise Exception("统计区间不一致。")
+	for key in ("replays", "rounds", "action_replays"):
+		summary[key] += other[key]
+	for key in ("reasons", "winners", "games", "actions"):
+		for name, count in other[key].items():
+			summary[key][name] = summary[key].get(name, 0) + count
+	summary["errors"].update(other["errors"])
+	_grow(summary, len(other["samples"]))
+	for key in ("type_counts", "energy_total", "energy_lead", "samples"):
+		for i, value in enumerate(other[key]):
+			summary[key][i] += value
+
+
+# 统计结果的报告：胜利原因、各队伍的胜率、每局的平均行动次数，以及按区间平均的种类构成与能量曲线
+def report(summary: dict) -> dict:
+	types = len(ENTITY_TYPES)
+	curves = []
+	for row, samples in enumerate(summary["samples"]):
+		if samples == 0:
+			continue
+		curves.append({
+			"round": row * summary["bucket"],
+			"replays": samples,
+			"types": {name: summary["type_counts"][row * types + i] / samples for i, name in enumerate(ENTITY_TYPES)},
+			"energy": summary["energy_total"][row] / samples,
+			"lead": summary["energy_lead"][row] / samples,
+		})
+	action_replays = summary["action_replays"]
+	return {
+		"replays": summary["replays"],
+		"average_rounds": summary["rounds"] / summary["replays"] if summary["replays"] else 0,
+		"reasons": summary["reasons"],
+		"win_rates": {name: summary["winners"].get(name, 0) / games for name, games in summary["games"].items()},
+		"actions_per_game": {action: count / action_replays for action, count in summary["actions"].items()} if action_replays else {},
+		"curves": curves,
+		"errors": summary["errors"],
+	}
+
+
+def find_replays(directory: str) -> Iterator[str]:
+	for root, _, names in os.walk(directory):
+		for name in sorted(names):
+			if name.endswith(REPLAY_SUFFIXES):
+				yield os.path.join(root, name)
+
+
+def _load_cache(path: str, bucket: int) -> dict:
+	try:
+		with open(path, "rb") as f:
+			cache = pickle.load(f)
+	except (OSError, pickle.UnpicklingError, EOFError):
+		return {}
+	if cache.get("version") != CACHE_VERSION or cache.get("bucket") != bucket:
+		return {}
+	return cache["replays"]
+
+
+def _save_cache(path: str, bucket: int, replays: dict) -> None:
+	tmp_path = "{}.{}.tmp".format(path, os.getpid())
+	with open(tmp_path, "wb") as f:
+		pickle.dump({"version": CACHE_VERSION, "bucket": bucket, "replays": replays}, f, pickle.HIGHEST_PROTOCOL)
+	os.replace(tmp_path, path)
+
+
+# 统计目录下的所有回放。已经处理过且没有改变的回放直接使用缓存，其余的回放在进程池中并行转换。
+# cache_path为None时不使用缓存，processes为0时在当前进程中处理
+def analyze_replays(directory: str, bucket: int = 10, processes: Optional[int] = None, cache_path: Optional[str] = "", progress: bool = False) -> dict:
+	if cache_path == "":
+		cache_path = os.path.join(directory, "analytics.cache")
+	cached = _load_cache(cache_path, bucket) if cache_path is not None else {}
+	replays = {}  # 回放路径 -> (大小与修改时间, 转换结果)
+	pending = []
+	for path in find_replays(directory):
+		entry = cached.get(path)
+		if entry is not None and entry[0] == _stamp(path):
+			replays[path] = entry
+		else:
+			pending.append((path, bucket))
+
+	summary = empty_summary(bucket)
+	if pending:
+		if processes == 0:
+			results = map(_analyze, pending)
+		else:
+			pool = multiprocessing.get_context("spawn").Pool(processes)
+			results = pool.imap_unordered(_analyze, pending, chunksize=max(1, len(pending) // (4 * (processes or os.cpu_count() or 1))))
+		for done, (path, stamp, columns, error) in enumerate(results, 1):
+			if error is not None:
+				summary["errors"][path] = error
+			else:
+				replays[path] = (stamp, columns)
+			if progress:
+				print("{}/{} {}".format(done, len(pending), path))
+		if processes != 0:
+			pool.close()
+			pool.join()
+	for path in sorted(replays):
+		merge_columns(summary, replays[path][1])
+	if cache_path is not None and pending:
+		_save_cache(cache_path, bucket, replays)
+	return summary
@@ -1,72 +1,94 @@
 from __future__ import annotations
-from typing import List, Tuple, Union
+import math
+from typing import List, Optional, Tuple, Union
 
-# 方向的基本类
+# 方向的基本类。九个单位方向均为唯一的只读实例，可以直接用is比较
 class Direction:
-	def __init__(self, dx: int = 0, dy: int = 0) -> None:
-		self.dx = dx
-		self.dy = dy
+	__slots__ = ("dx", "dy")
+	_interned = {}  # (dx, dy) -> 唯一实例
+
+	def __new__(cls, dx: int = 0, dy: int = 0) -> Direction:
+		direction = cls._interned.get((dx, dy))
+		if direction is None:
+			direction = object.__new__(cls)
+			object.__setattr__(direction, "dx", dx)
+			object.__setattr__(direction, "dy", dy)
+		return direction
+
+	def __setattr__(self, key: str, value: object) -> None:
+		raise Exception("方向为只读。")
+
+	def __delattr__(self, key: str) -> None:
+		raise Exception("方向为只读。")
+
+	def __reduce__(self) -> tuple:
+		return Direction, (self.dx, self.dy)
+
+	def __copy__(self) -> Direction:
+		return self
+
+	def __deepcopy__(self, memo: dict) -> Direction:
+		return self
 
 	def __repr__(self) -> str:
-		names = [["south_west", "west", "north_west"], ["south", "center", "north"], ["south_east", "east", "north_east"]]
-		return str(names[self.dx + 1][self.dy + 1])
+		return _DIRECTION_NAMES[self.dx + 1][self.dy + 1]
 
 	def __str__(self) -> str:
-		names = [["south_west", "west", "north_west"], ["south", "center", "north"], ["south_east", "east", "north_east"]]
-		return str(names[self.dx + 1][self.dy + 1])
+		return _DIRECTION_NAMES[self.dx + 1][self.dy + 1]
 
 	def __eq__(self, d: object) -> bool:
+		if d is self:
+			return True
 		if isinstance(d, Direction):
 			return self.equals(d)
 		return False
 
+	def __hash__(self) -> int:
+		return hash((self.dx, self.dy))
+
 	@staticmethod
 	def center() -> Direction:
-		return Direction(0, 0)
+		return _CENTER
 
 	@staticmethod
 	def north() -> Direction:
-		return Direction(0, 1)
+		return _NORTH
 
 	@staticmethod
 	def north_east() -> Direction:
-		return Direction(1, 1)
+		return _NORTH_EAST
 
 	@staticmethod
 	def east() -> Direction:
-		return Direction(1, 0)
+		return _EAST
 
 	@staticmethod
 	def south_east() -> Direction:
-		return Direction(1, -1)
+		return _SOUTH_EAST
 
 	@staticmethod
 	def south() -> Direction:
-		return Direction(0, -1)
+		return _SOUTH
 
 	@staticmethod
 	def south_west() -> Direction:
-		return Direction(-1, -1)
+		return _SOUTH_WEST
 
 	@staticmethod
 	def west() -> Direction:
-		return Direction(-1, 0)
+		return _WEST
 
 	@staticmethod
 	def north_west() -> Direction:
-		return Direction(-1, 1)
+		return _NORTH_WEST
 
 	@staticmethod
 	def all_directions() -> List[Direction]:
-		dirs = []
-		for i in [0, -1, 1]:
-			for j in [0, -1, 1]:
-				dirs.append(Direction(i, j))
-		return dirs
+		return list(_ALL_DIRECTIONS)
 
 	@staticmethod
 	def cardinal_directions() -> List[Direction]:
-		return [Direction.north(), Direction.south(), Direction.east(), Direction.west()]
+		return [_NORTH, _SOUTH, _EAST, _WEST]
 
 	def get_dx(self) -> int:
 		return self.dx
@@ -79,28 +101,34 @@ class Direction:
 
 	def rotate_left(self) -> Direction:
 		if self.dx == 0 and self.dy == 0:
-			return self.center()
-		_ordered_dirs = [
-			self.east(), self.north_east(), self.north(), self.north_west(),
-			self.west(), self.south_west(), self.south(), self.south_east()
-		]
-		return _ordered_dirs[(_ordered_dirs.index(self) + 1) % 8]
+			return _CENTER
+		return _ROTATE_LEFT[self.dx, self.dy]
 
 	def rotate_right(self) -> Direction:
 		if self.dx == 0 and self.dy == 0:
-			return self.center()
-		_ordered_dirs = [
-			self.east(), self.north_east(), self.north(), self.north_west(),
-			self.west(), self.south_west(), self.south(), self.south_east()
-		]
-		return _ordered_dirs[(_ordered_dirs.index(self) - 1) % 8]
+			return _CENTER
+		return _ROTATE_RIGHT[self.dx, self.dy]
 
 	def equals(self, d: Direction) -> bool:
 		return self.dx == d.dx and self.dy == d.dy
 
 
+_DIRECTION_NAMES = [["south_west", "west", "north_west"], ["south", "center", "north"], ["south_east", "east", "north_east"]]
+for _dx in (-1, 0, 1):
+	for _dy in (-1, 0, 1):
+		Direction._interned[_dx, _dy] = Direction(_dx, _dy)
+_CENTER, _NORTH, _NORTH_EAST, _EAST, _SOUTH_EAST, _SOUTH, _SOUTH_WEST, _WEST, _NORTH_WEST = (Direction(dx, dy) for dx, dy in (
+	(0, 0), (0, 1), (1, 1), (1, 0), (1, -1), (0, -1), (-1, -1), (-1, 0), (-1, 1)))
+_ALL_DIRECTIONS = tuple(Direction(i, j) for i in (0, -1, 1) for j in (0, -1, 1))
+_ORDERED_DIRECTIONS = (_EAST, _NORTH_EAST, _NORTH, _NORTH_WEST, _WEST, _SOUTH_WEST, _SOUTH, _SOUTH_EAST)  # 逆时针顺序
+_ROTATE_LEFT = {(d.dx, d.dy): _ORDERED_DIRECTIONS[(i + 1) % 8] for i, d in enumerate(_ORDERED_DIRECTIONS)}
+_ROTATE_RIGHT = {(d.dx, d.dy): _ORDERED_DIRECTIONS[(i - 1) % 8] for i, d in enumerate(_ORDERED_DIRECTIONS)}
+
+
 # 地图位置的基本类
 class MapLocation:
+	__slots__ = ("x", "y")
+
 	def __init__(self, x: int = 0, y: int = 0) -> None:
 		self.x = x
 		self.y = y
@@ -154,8 +182,64 @@ class MapLocation:
 		return self.x, self.y
 
 
-# 实体类型的基本类
+# 只读的地图位置。交给玩家代码的其他实体的位置均为此类型，可以被安全地共享
+class FrozenMapLocation(MapLocation):
+	__slots__ = ()
+
+	def __init__(self, x: int = 0, y: int = 0) -> None:
+		object.__setattr__(self, "x", x)
+		object.__setattr__(self, "y", y)
+
+	def __setattr__(self, key: str, value: object) -> None:
+		raise Exception("位置信息为只读。")
+
+	def __delattr__(self, key: str) -> None:
+		raise Exception("位置信息为只读。")
+
+	def __copy__(self) -> FrozenMapLocation:
+		return self
+
+	def __deepcopy__(self, memo: dict) -> FrozenMapLocation:
+		return self
+
+	def __reduce__(self) -> tuple:
+		return FrozenMapLocation, (self.x, self.y)
+
+
+_DISC_OFFSETS = {}  # 半径 -> 偏移表
+_DISC_SPANS = {}  # 半径 -> 按列的偏移范围
+
+
+# 欧几里得距离平方不超过radius的所有偏移(dx, dy)，按dx、dy升序排列。同一半径的结果会被缓存并共享
+def disc_offsets(radius: int) -> Tuple[Tuple[int, int], ...]:
+	offsets = _DISC_OFFSETS.get(radius)
+	if offsets is None:
+		offsets = _DISC_OFFSETS[radius] = tuple((dx, dy) for dx, half in disc_spans(radius) for dy in range(-half, half + 1))
+	return offsets
+
+
+# 按列描述的同一个圆盘，每一项为(dx, half)，表示该列的dy范围为[-half, half]
+def disc_spans(radius: int) -> Tuple[Tuple[int, int], ...]:
+	spans = _DISC_SPANS.get(radius)
+	if spans is None:
+		if radius < 0:
+			raise Exception("半径必须为非负数。")
+		r = math.isqrt(radius)
+		spans = _DISC_SPANS[radius] = tuple((dx, math.isqrt(radius - dx * dx)) for dx in range(-r, r + 1))
+	return spans
+
+
+# 实体类型的基本类。每个种类只有一个只读实例，EntityType(name)总是返回同一个对象
 class EntityType:
+	__slots__ = ("name", "action_cooldown", "action_radius", "defence_ratio", "detection_radius", "initial_cooldown", "sensor_radius")
+	_interned = {}  # 种类名 -> 唯一实例
+
+	def __new__(cls, entity_type: str) -> EntityType:
+		rtype = cls._interned.get(entity_type)
+		if rtype is None:
+			raise Exception("无效的种类。")
+		return rtype
+
 	def __repr__(self) -> str:
 		return self.name
 
@@ -163,55 +247,56 @@ class EntityType:
 		return self.name
 
 	def __eq__(self, etype: Union[EntityType, str]) -> bool:
-		if isinstance(etype, EntityType):
+		if etype is self:
+			return True
+		elif isinstance(etype, EntityType):
 			return self.name == etype.name
 		elif isinstance(etype, str):
 			return self.name == etype
 		return False
 
-	def __init__(self, entity_type: str) -> None:
-		if entity_type == "destroyer":
-			self.name = entity_type
-			self.action_cooldown = 1.0
-			self.action_radius = 9
-			self.defence_ratio = 1.0
-			self.detection_radius = 25
-			self.initial_cooldown = 10
-			self.sensor_radius = 25
-		elif entity_type == "miner":
-			self.name = entity_type
-			self.action_cooldown = 2.0
-			self.action_radius = 0
-			self.defence_ratio = 1.0
-			self.detection_radius = 20
-			self.initial_cooldown = 0
-			self.sensor_radius = 20
-		elif entity_type == "scout":
-			self.name = entity_type
-			self.action_cooldown = 1.5
-			self.action_radius = 12
-			self.defence_ratio = 0.7
-			self.detection_radius = 40
-			self.initial_cooldown = 10
-			self.sensor_radius = 30
-		elif entity_type == "planet":
-			self.name = entity_type
-			self.action_cooldown = 2.0
-			self.action_radius = 2
-			self.defence_ratio = 1.0
-			self.detection_radius = 40
-			self.initial_cooldown = 0
-			self.sensor_radius = 40
-		else:
-			raise Exception("无效的种类。")
+	def __hash__(self) -> int:
+		return hash(self.name)
+
+	# 种类的属性在创建后不可修改，因此同一个对象可以在引擎与玩家代码之间共享
+	def __setattr__(self, key: str, value: object) -> None:
+		raise Exception("实体种类为只读。")
+
+	def __delattr__(self, key: str) -> None:
+		raise Exception("实体种类为只读。")
+
+	def __reduce__(self) -> tuple:
+		return EntityType, (self.name,)
+
+	def __copy__(self) -> EntityType:
+		return self
+
+	def __deepcopy__(self, memo: dict) -> EntityType:
+		return self
+
+	@classmethod
+	def _define(cls, name: str, action_cooldown: float, action_radius: int, defence_ratio: float, detection_radius: int, initial_cooldown: int, sensor_radius: int) -> None:
+		rtype = object.__new__(cls)
+		for key, value in (("name", name), ("action_cooldown", action_cooldown), ("action_radius", action_radius), ("defence_ratio", defence_ratio),
+				("detection_radius", detection_radius), ("initial_cooldown", initial_cooldown), ("sensor_radius", sensor_radius)):
+			object.__setattr__(rtype, key, value)
+		cls._interned[name] = rtype
 
 	@staticmethod
 	def all_types() -> List[EntityType]:
 		return [EntityType("destroyer"), EntityType("miner"), EntityType("scout"), EntityType("planet")]
 
 
+EntityType._define("destroyer", action_cooldown=1.0, action_radius=9, defence_ratio=1.0, detection_radius=25, initial_cooldown=10, sensor_radius=25)
+EntityType._define("miner", action_cooldown=2.0, action_radius=0, defence_ratio=1.0, detection_radius=20, initial_cooldown=0, sensor_radius=20)
+EntityType._define("scout", action_cooldown=1.5, action_radius=12, defence_ratio=0.7, detection_radius=40, initial_cooldown=10, sensor_radius=30)
+EntityType._define("planet", action_cooldown=2.0, action_radius=2, defence_ratio=1.0, detection_radius=40, initial_cooldown=0, sensor_radius=40)
+
+
 # 实体信息的基本类
 class EntityInfo:
+	__slots__ = ("energy", "defence", "init_defence", "ID", "location", "team", "type", "radio")
+
 	def __init__(self, defence: int, rid: int, energy: int, location: MapLocation, team: Team, rtype: EntityType, radio: int) -> None:
 		self.energy = energy  # 能量值
 		self.defence = defence if rtype.name != "planet" else self.energy  # 防护值
@@ -229,7 +314,66 @@ class EntityInfo:
 		return {"ID": self.ID, "energy": self.energy, "defence": self.defence, "location": self.location.to_tuple(), "team": self.team.tag, "type": self.type.name, "radio": self.radio}
 
 
+# 实体信息的只读快照。感知到的实体以此形式交给玩家代码，玩家无法通过它修改引擎状态
+class EntitySnapshot(EntityInfo):
+	__slots__ = ()
+
+	def __init__(self, info: EntityInfo, rtype: Optional[EntityType] = None) -> None:
+		location = info.location
+		setter = object.__setattr__
+		setter(self, "energy", info.energy)
+		setter(self, "defence", info.defence)
+		setter(self, "init_defence", info.init_defence)
+		setter(self, "ID", info.ID)
+		setter(self, "location", location if isinstance(location, FrozenMapLocation) else FrozenMapLocation(location.x, location.y))
+		setter(self, "team", info.team)  # 队伍与种类均不可修改，直接共享
+		setter(self, "type", info.type if rtype is None else rtype)
+		setter(self, "radio", info.radio)
+
+	def __setattr__(self, key: str, value: object) -> None:
+		raise Exception("实体信息为只读。")
+
+	def __delattr__(self, key: str) -> None:
+		raise Exception("实体信息为只读。")
+
+	def __copy__(self) -> EntitySnapshot:
+		return self
+
+	def __deepcopy__(self, memo: dict) -> EntitySnapshot:
+		return self
+
+	def __reduce__(self) -> tuple:
+		return EntitySnapshot, (_InfoFields(self.energy, self.defence, self.init_defence, self.ID, self.location, self.team, self.type, self.radio),)
+
+
+# 用于重建快照的实体信息
+class _InfoFields(EntityInfo):
+	__slots__ = ()
+
+	def __init__(self, energy: int, defence: int, init_defence: int, rid: int, location: MapLocation, team: Team, rtype: EntityType, radio: int) -> None:
+		self.energy = energy
+		self.defence = defence
+		self.init_defence = init_defence
+		self.ID = rid
+		self.location = location
+		self.team = team
+		self.type = rtype
+		self.radio = radio
+
+
+# 队伍的基本类。每个tag只有一个只读实例，Team(tag)总是返回同一个对象
 class Team:
+	__slots__ = ("tag",)
+	_interned = {}  # tag -> 唯一实例
+
+	def __new__(cls, team: str) -> Team:
+		tag = str(team)
+		instance = cls._interned.get(tag)
+		if instance is None:
+			instance = cls._interned[tag] = object.__new__(cls)
+			object.__setattr__(instance, "tag", tag)
+		return instance
+
 	def __repr__(self) -> str:
 		return self.tag
 
@@ -237,14 +381,32 @@ class Team:
 		return self.tag
 
 	def __eq__(self, team: Union[Team, str]) -> bool:
-		if isinstance(team, Team):
+		if team is self:
+			return True
+		elif isinstance(team, Team):
 			return self.tag == team.tag
 		elif isinstance(team, str):
 			return self.tag == team
 		return False
 
-	def __init__(self, team: str) -> None:
-		self.tag = str(team)
+	def __hash__(self) -> int:
+		return hash(self.tag)
+
+	# 队伍在创建后不可修改，因此同一个对象可以在引擎与玩家代码之间共享
+	def __setattr__(self, key: str, value: object) -> None:
+		raise Exception("队伍信息为只读。")
+
+	def __delattr__(self, key: str) -> None:
+		raise Exception("队伍信息为只读。")
+
+	def __reduce__(self) -> tuple:
+		return Team, (self.tag,)
+
+	def __copy__(self) -> Team:
+		return self
+
+	def __deepcopy__(self, memo: dict) -> Team:
+		return self
 
 	def is_player(self) -> bool:
 		return self.tag != "Neutral"
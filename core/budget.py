@@ -0,0 +1,133 @@
+import time
+import signal
+import threading
+import contextlib
+from typing import Callable, Iterator, Optional, Tuple
+
+from core.api import EntityInfo
+
+
+# 超出时间预算时在玩家代码中抛出的异常。继承BaseException，因此玩家代码中的except Exception不会捕获它
+class TurnTimeout(BaseException):
+	pass
+
+
+# 定时器只在玩家代码中抛出TurnTimeout。在引擎的记录或者与队伍进程的通信中到期时只做标记，
+# 下一次进入玩家代码时再抛出，否则由TurnBudget.run在返回后按耗时判定超时
+_in_player = False
+_expired = False
+_armed = None  # 正在计时的预算。所有预算共用同一个信号处理函数，例如分支与原比赛各有一个预算
+
+
+def _alarm(signum: int, frame: object) -> None:
+	global _expired
+	if _armed is not None:
+		_expired = True
+		if _in_player:
+			raise TurnTimeout()
+
+
+# 标记一段玩家代码（或者等待队伍进程运行玩家代码）
+@contextlib.contextmanager
+def player_code() -> Iterator[None]:
+	global _in_player
+	if _expired:
+		raise TurnTimeout()
+	try:
+		_in_player = True
+		yield
+	finally:
+		_in_player = False
+
+
+# 玩家代码调用的引擎代码，例如计算并缓存时间场。期间到期的定时器不会打断它，
+# 而是在返回玩家代码时再抛出，这样已经完成的工作不会因为超时而被丢弃
+@contextlib.contextmanager
+def engine_code() -> Iterator[None]:
+	global _in_player
+	in_player = _in_player
+	_in_player = False
+	try:
+		yield
+	finally:
+		_in_player = in_player
+	if _in_player and _expired:
+		raise TurnTimeout()
+
+
+# 玩家代码的时间预算（秒）。turn_time为每个实体回合的上限，team_time为每个队伍每回合的总上限。
+# 超出预算的实体回合会被作废：本回合内的所有行动与状态修改都不会生效。
+class TurnBudget:
+	def __init__(self, turn_time: Optional[float] = None, team_time: Optional[float] = None) -> None:
+		self.turn_time = turn_time
+		self.team_time = team_time
+		self.round = 0
+		self.round_used = {}  # 本回合每个队伍已经使用的时间
+		self.overruns = []  # 所有超出预算的记录
+		# 在支持的平台上用定时器打断超时的玩家代码，否则只能在其返回后作废
+		self.use_timer = hasattr(signal, "setitimer") and threading.current_thread() is threading.main_thread()
+		if self.use_timer:
+			signal.signal(signal.SIGALRM, _alarm)
+
+	def begin_round(self, round_count: int) -> None:
+		self.round = round_count
+		self.round_used = {}
+
+	# 本实体回合可以使用的时间（None表示不限制）以及起作用的是哪一项预算
+	def allowance(self, team: str) -> Tuple[Optional[float], str]:
+		if self.team_time is not None:
+			remaining = self.team_time - self.round_used.get(team, 0.0)
+			if self.turn_time is None or remaining < self.turn_time:
+				return remaining, "team"
+		return self.turn_time, "turn"
+
+	def _overrun(self, info: EntityInfo, reason: str, elapsed: float) -> None:
+		self.overruns.append({"round": self.round, "ID": info.ID, "team": info.team.tag, "type": info.type.name, "reason": reason, "time": elapsed})
+		print("[Team {}] 实体 {} 超出时间预算（{}，{:.1f}ms），本回合的行动作废。".format(info.team, info.ID, reason, elapsed * 1000))
+
+	# 在预算内运行玩家代码。超出预算时返回None
+	def run(self, run_player: Callable[[], object], info: EntityInfo) -> Optional[object]:
+		global _in_player, _expired, _armed
+		team = info.team.tag
+		limit, reason = self.allowance(team)
+		if limit is not None and limit <= 0:  # 队伍本回合的时间已经用完
+			self._overrun(info, reason, 0.0)
+			return None
+
+		timed_out = False
+		start = time.perf_counter()
+		try:
+			try:
+				if self.use_timer and limit is not None:
+					_armed = self
+					signal.setitimer(signal.ITIMER_REAL, limit)
+				result = run_player()
+			finally:
+				if _armed is self:
+					_armed = None
+					signal.setitimer(signal.ITIMER_REAL, 0)
+					_in_player = _expired = False
+		except TurnTimeout:
+			timed_out = True
+			result = None
+		elapsed = time.perf_counter() - start
+		self.round_used[team] = self.round_used.get(team, 0.0) + elapsed
+
+		if timed_out or (limit is not None and elapsed > limit):
+			self._overrun(info, reason, elapsed)
+			return None
+		return result
+
+	def summary(self) -> dict:
+		teams = {}
+		for overrun in self.overruns:
+			entry = teams.setdefault(overrun["team"], {"turn": 0, "team": 0})
+			entry[overrun["reason"]] += 1
+		return {"turn_time": self.turn_time, "team_time": self.team_time, "teams": teams, "overruns": self.overruns}
+
+	def print_summary(self) -> None:
+		if not self.overruns:
+			return
+		print("========\n超出时间预算的实体回合：")
+		for team, entry in sorted(self.summary()["teams"].items()):
+			print("[Team {}] 单回合超时：{} 次，队伍总时间耗尽：{} 次".format(team, entry["turn"], entry["team"]))
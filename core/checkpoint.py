@@ -0,0 +1,33 @@
+import os
+import zlib
+import pickle
+import struct
+
+# 比赛检查点。文件结构：文件头 | zlib压缩的pickle数据
+# 检查点只在回合之间写入，内容由Instance.save_checkpoint决定
+CHECKPOINT_MAGIC = b"CSCK"
+CHECKPOINT_VERSION = 1
+_HEADER = struct.Struct("<4sH")  # 标识、版本
+
+
+# 写入检查点。先写入临时文件再替换，中途退出不会破坏已有的检查点
+def write_checkpoint(path: str, state: dict) -> None:
+	directory = os.path.dirname(path)
+	if directory:
+		os.makedirs(directory, exist_ok=True)
+	temp_path = "{}.{}.tmp".format(path, os.getpid())
+	with open(temp_path, "wb") as f:
+		f.write(_HEADER.pack(CHECKPOINT_MAGIC, CHECKPOINT_VERSION))
+		f.write(zlib.compress(pickle.dumps(state, pickle.HIGHEST_PROTOCOL)))
+	os.replace(temp_path, path)
+
+
+def read_checkpoint(path: str) -> dict:
+	with open(path, "rb") as f:
+		data = f.read()
+	if len(data) < _HEADER.size:
+		raise Exception("无法识别的检查点文件。")
+	magic, version = _HEADER.unpack_from(data)
+	if magic != CHECKPOINT_MAGIC or version != CHECKPOINT_VERSION:
+		raise Exception("无法识别的检查点文件。")
+	return pickle.loads(zlib.decompress(data[_HEADER.size:]))
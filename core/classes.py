@@ -1,26 +1,213 @@
-from typing import List, Tuple
+import math
+import bisect
+from array import array
+from typing import Callable, List, Sequence, Tuple
+
+from core.api import EntityInfo, EntitySnapshot, EntityType, disc_spans
+from core.budget import engine_code
+from core.flowfield import map_key, cached_travel_field, read_fields
 
 # 定义游戏地图的类
 class Map:
 	def __init__(self, aether_dense: List[dict], map_size: Tuple[int, int], dx: int = 0, dy: int = 0) -> None:
-		self.content = []
 		self.width = map_size[0]
 		self.height = map_size[1]
 		self.dx = dx
 		self.dy = dy
-		for i in range(self.width):
-			line = []
-			for j in range(self.height):
-				for block in aether_dense:
-					if block["x"] == i and block["y"] == j:
-						line.append(block["aether"])
-			self.content.append(line)
+		self.aether = array("d", [float("nan")]) * (self.width * self.height)  # 按x优先连续存放的以太密度
+		self.key = None  # 地图的标识，用于共享移动时间场，第一次使用时计算
+		self.fields_path = None  # 引擎预先计算的时间场文件，没有时为None
+		self.fields = None  # 从文件中读取的时间场，第一次使用时映射到内存
+		for block in aether_dense:  # 每个格子直接放入对应的位置
+			if 0 <= block["x"] < self.width and 0 <= block["y"] < self.height:
+				self.aether[block["x"] * self.height + block["y"]] = block["aether"]
+
+	# 由按x优先排列的以太密度数组创建地图
+	@classmethod
+	def from_array(cls, aether: Sequence[float], map_size: Tuple[int, int], dx: int = 0, dy: int = 0) -> "Map":
+		gmap = cls([], map_size, dx, dy)
+		if len(aether) != gmap.width * gmap.height:
+			raise Exception("地图数据不完整。")
+		gmap.aether = array("d", aether)
+		return gmap
+
+	# 按列嵌套的以太密度，content[x][y]
+	@property
+	def content(self) -> List[List[float]]:
+		h = self.height
+		return [self.aether[i * h:(i + 1) * h].tolist() for i in range(self.width)]
 
 	def get_aether(self, x: int, y: int) -> float:
-		return self.content[x-self.dx][y-self.dy]
+		return self.aether[(x - self.dx) * self.height + (y - self.dy)]
+
+	# 获得与指定位置的欧几里得距离平方不超过radius的所有地图格子，每一项为(x, y, 以太密度)
+	def get_aether_disc(self, x: int, y: int, radius: int) -> List[Tuple[int, int, float]]:
+		h = self.height
+		x0 = self.dx
+		x1 = self.dx + self.width - 1
+		result = []
+		for offset, half in disc_spans(radius):
+			i = x + offset
+			if i < x0 or i > x1:
+				continue
+			y0 = max(y - half, self.dy)
+			y1 = min(y + half, self.dy + h - 1)
+			if y0 > y1:
+				continue
+			base = (i - self.dx) * h - self.dy
+			column = self.aether[base + y0:base + y1 + 1]  # 同一列的格子在数组中是连续的
+			result.extend(zip([i] * len(column), range(y0, y1 + 1), column))
+		return result
+
+	# 每个格子到达目标位置(x, y)的以太加权最短移动时间，按地图内坐标x优先存放
+	def travel_times(self, x: int, y: int) -> Sequence[float]:
+		tx, ty = x - self.dx, y - self.dy
+		if self.fields_path is not None:
+			if self.fields is None:
+				self.fields = read_fields(self.fields_path, self.get_key(), self.width, self.height)
+			field = self.fields.get((tx, ty))
+			if field is not None:
+				return field
+		with engine_code():  # 计算不会被时间预算打断，完成后缓存起来
+			return cached_travel_field(self.get_key(), self.aether, self.width, self.height, tx, ty)
+
+	# 内存映射的时间场不随地图传给队伍进程，由各个进程自己映射
+	def __getstate__(self) -> dict:
+		return dict(self.__dict__, fields=None)
+
+	# 由尺寸与以太密度决定的地图标识，与随机偏移无关
+	def get_key(self) -> bytes:
+		if self.key is None:
+			self.key = map_key(self.aether, self.width, self.height)
+		return self.key
 
 	def include(self, x: int, y: int) -> bool:
 		return (self.dx <= x < self.dx + self.width) and (self.dy <= y < self.dy + self.height)
 
 	def to_dict(self) -> dict:
-		return {"content": self.content, "size": (self.width, self.height), "origin": (self.dx, self.dy)}
\ No newline at end of file
+		return {"content": self.content, "size": (self.width, self.height), "origin": (self.dx, self.dy)}
+
+# 实体的空间索引。将地图划分为均匀的网格，按格子记录其中实体的ID
+class SpatialGrid:
+	def __init__(self, cell_size: int = 8) -> None:
+		self.cell_size = cell_size
+		self.cells = {}  # 每个格子中的实体ID，键为格子坐标
+		self.positions = {}  # 每个实体当前的位置与所在格子
+
+	def __len__(self) -> int:
+		return len(self.positions)
+
+	def __contains__(self, rid: int) -> bool:
+		return rid in self.positions
+
+	def copy(self) -> "SpatialGrid":
+		grid = SpatialGrid(self.cell_size)
+		grid.cells = {cell: set(bucket) for cell, bucket in self.cells.items()}
+		grid.positions = dict(self.positions)
+		return grid
+
+	def cell_of(self, x: int, y: int) -> Tuple[int, int]:
+		return x // self.cell_size, y // self.cell_size
+
+	def insert(self, rid: int, x: int, y: int) -> None:
+		cell = self.cell_of(x, y)
+		self.cells.setdefault(cell, set()).add(rid)
+		self.positions[rid] = (x, y, cell)
+
+	def remove(self, rid: int) -> None:
+		_, _, cell = self.positions.pop(rid)
+		bucket = self.cells[cell]
+		bucket.discard(rid)
+		if not bucket:
+			del self.cells[cell]
+
+	# 更新实体的位置，只有跨越格子时才需要移动桶
+	def move(self, rid: int, x: int, y: int) -> None:
+		ox, oy, cell = self.positions[rid]
+		if ox == x and oy == y:
+			return
+		new_cell = self.cell_of(x, y)
+		if new_cell != cell:
+			self.remove(rid)
+			self.insert(rid, x, y)
+		else:
+			self.positions[rid] = (x, y, cell)
+
+	# 查询与指定位置的欧几里得距离平方不超过radius的所有实体ID
+	def query(self, x: int, y: int, radius: int) -> List[int]:
+		r = math.isqrt(radius)
+		cs = self.cell_size
+		result = []
+		for cx in range((x - r) // cs, (x + r) // cs + 1):
+			for cy in range((y - r) // cs, (y + r) // cs + 1):
+				bucket = self.cells.get((cx, cy))
+				if bucket is None:
+					continue
+				for rid in bucket:
+					px, py, _ = self.positions[rid]
+					if (px - x) ** 2 + (py - y) ** 2 <= radius:
+						result.append(rid)
+		return result
+
+
+# 世界状态的只读快照。缓存每个在场实体的EntitySnapshot，实体状态改变时由引擎使对应的缓存失效
+class WorldSnapshot:
+	def __init__(self, source: Callable[[int], EntityInfo]) -> None:
+		self.source = source  # 根据ID获取实体当前信息的方法
+		self.snapshots = {}  # 实体真实信息的快照
+		self.disguised = {}  # 实体以其他种类出现时的快照
+
+	def get(self, rid: int) -> EntitySnapshot:
+		snapshot = self.snapshots.get(rid)
+		if snapshot is None:
+			snapshot = self.snapshots[rid] = EntitySnapshot(self.source(rid))
+		return snapshot
+
+	def get_disguised(self, rid: int, rtype: EntityType) -> EntitySnapshot:
+		snapshot = self.disguised.get(rid)
+		if snapshot is None:
+			snapshot = self.disguised[rid] = EntitySnapshot(self.get(rid), rtype)
+		return snapshot
+
+	# 实体的状态发生了变化或者已被删除
+	def invalidate(self, rid: int) -> None:
+		self.snapshots.pop(rid, None)
+		self.disguised.pop(rid, None)
+
+
+# 各队伍的过载加成记录。记录按过期轮数升序保存，并维护能量的前缀和，过期的记录会被移除
+class OverdriveLedger:
+	def __init__(self) -> None:
+		self.expires = {}  # 队伍tag -> 各项记录的过期轮数
+		self.prefix = {}  # 队伍tag -> 能量的前缀和，比过期轮数多一项
+
+	# 增加一项记录。过期轮数不能早于该队伍已有的记录
+	def add(self, tag: str, energy: int, expire: int) -> None:
+		expires = self.expires.setdefault(tag, [])
+		prefix = self.prefix.setdefault(tag, [0])
+		if expires and expire < expires[-1]:
+			raise Exception("过载记录的过期轮数必须递增。")
+		expires.append(expire)
+		prefix.append(prefix[-1] + energy)
+
+	def copy(self) -> "OverdriveLedger":
+		ledger = OverdriveLedger()
+		ledger.expires = {tag: list(expires) for tag, expires in self.expires.items()}
+		ledger.prefix = {tag: list(prefix) for tag, prefix in self.prefix.items()}
+		return ledger
+
+	# 移除过期轮数不晚于round_count的记录
+	def expire(self, round_count: int) -> None:
+		for tag, expires in self.expires.items():
+			index = bisect.bisect_right(expires, round_count)
+			if index:
+				del expires[:index]
+				del self.prefix[tag][:index]
+
+	# 过期轮数晚于round_count的记录的能量总和
+	def total(self, tag: str, round_count: int) -> int:
+		expires = self.expires.get(tag)
+		if not expires:
+			return 0
+		prefix = self.prefix[tag]
+		return prefix[-1] - prefix[bisect.bisect_right(expires, round_count)]
@@ -1,14 +1,17 @@
-import math
+from __future__ import annotations
 import copy
-from typing import List, Optional, Union, Tuple
+import math
+import heapq
+from array import array
+from typing import Iterator, List, Mapping, Optional, Union, Tuple
 
 from core.api import *
-from core.classes import Map
+from core.classes import Map, WorldSnapshot, OverdriveLedger
 
 
 # 实体控制类。记录要产生的行为，并通过get_action函数回调。
 class Controller:
-	def __init__(self, info: EntityInfo, sensed_entities: List[EntityInfo], detected_entities: List[MapLocation], teams_info: List[Team], charge_point: int, gmap: Map, cooldown: float, round_count: int, overdrive_factor: List[list], entity_count: int) -> None:
+	def __init__(self, info: EntityInfo, sensed_entities: List[EntityInfo], detected_entities: List[MapLocation], teams_info: List[Team], charge_point: int, gmap: Map, cooldown: float, round_count: int, overdrive_ledger: OverdriveLedger, entity_count: int) -> None:
 		self.__info = info  # 传入的信息。应当在控制后更新到全局
 		self.__cooldown = cooldown  # 传入的冷却信息。应当在控制后更新到全局
 		self.__sensed_entities = sensed_entities  # 感知到的实体
@@ -17,8 +20,11 @@ class Controller:
 		self.__charge_point = charge_point  # 本队的充能点
 		self.__map = gmap  # 地图信息
 		self.__round_count = round_count  # 当前的轮数
-		self.__overdrive_factor = overdrive_factor  # 全局的过载倍率，每一项为[队伍tag，能量，过期轮数]
+		self.__overdrive_ledger = overdrive_ledger  # 全局的过载加成记录，与引擎共享，只读
 		self.__entity_count = entity_count
+		self.__by_loc = None  # 感知到的实体按位置的索引，第一次使用时建立
+		self.__by_id = None  # 感知到的实体按ID的索引，第一次使用时建立
+		self.__detected_locs = None  # 探测到的位置的集合，第一次使用时建立
 
 		# 以下为回调所调用的数据
 		self.__charged = 0  # 用以充能的点数
@@ -31,21 +37,23 @@ class Controller:
 
 	# 根据传入的实体信息检索指定位置的实体的详细信息
 	def __search_by_loc(self, loc: MapLocation) -> Optional[EntityInfo]:
-		for info in self.__sensed_entities:
-			if info.location == loc:
-				return info
-		return None
+		if self.__by_loc is None:
+			self.__by_loc = {}
+			for info in self.__sensed_entities:  # 同一位置以第一个实体为准
+				self.__by_loc.setdefault((info.location.x, info.location.y), info)
+		return self.__by_loc.get((loc.x, loc.y))
 
 	# 根据传入的实体信息检索指定ID的实体的详细信息
 	def __search_by_id(self, rid: int) -> Optional[EntityInfo]:
-		for info in self.__sensed_entities:
-			if info.ID == rid:
-				return info
-		return None
+		if self.__by_id is None:
+			self.__by_id = {}
+			for info in self.__sensed_entities:
+				self.__by_id.setdefault(info.ID, info)
+		return self.__by_id.get(rid)
 
 	# 获得在现在位置执行动作所需要的冷却
 	def __get_cooldown(self, base_cooldown: float) -> float:
-		return base_cooldown / self.sense_aether(self.__info.location)
+		return base_cooldown / self.__map.get_aether(self.__info.location.x, self.__info.location.y)
 
 	def get_all_teams(self) -> List[Team]:
 		return self.__teams_info
@@ -64,10 +72,7 @@ class Controller:
 	def get_overdrive_factor(self, team: Team, round: int = 0) -> float:
 		if round < 0:
 			raise Exception("轮数必须为非负数。")
-		index = 0
-		for i in self.__overdrive_factor:
-			if team == i[0] and i[2] > self.get_round_num() + round:  # 如果是同一队并且过期轮数大于当前轮数，则累加
-				index += i[1]
+		index = self.__overdrive_ledger.total(str(team), self.get_round_num() + round)  # 同一队过期轮数大于指定轮数的能量之和
 		return (1.0 + 0.001) ** index
 
 	def get_defence(self) -> int:
@@ -118,10 +123,9 @@ class Controller:
 			raise Exception("超出探测范围。")
 		elif not self.on_the_map(loc):
 			raise Exception("指定位置不在地图上。")
-		for entity in self.__detected_entities:
-			if entity == loc:
-				return True
-		return False
+		if self.__detected_locs is None:
+			self.__detected_locs = {(entity.x, entity.y) for entity in self.__detected_entities}
+		return (loc.x, loc.y) in self.__detected_locs
 
 	# 检查自己是否可以执行动作
 	def is_ready(self) -> bool:
@@ -172,6 +176,21 @@ class Controller:
 					entities.append(entity)
 		return entities
 
+	# 感知范围内距离center（默认为自身位置）最近的k个实体，按距离从近到远排列，距离相同时保持感知顺序。
+	# 可以按队伍与种类筛选，不包括自身
+	def k_nearest_entities(self, k: int, center: Optional[MapLocation] = None, teams: Optional[List[Team]] = None, types: Optional[List[EntityType]] = None) -> List[EntityInfo]:
+		if center is None:
+			center = self.get_location()
+		cx, cy = center.x, center.y
+		own = self.get_id()
+		candidates = [entity for entity in self.__sensed_entities if entity.ID != own and (teams is None or entity.team in teams) and (types is None or entity.type in types)]
+		return heapq.nsmallest(k, candidates, key=lambda entity: (entity.location.x - cx) ** 2 + (entity.location.y - cy) ** 2)
+
+	# 感知范围内距离center（默认为自身位置）最近的实体，没有符合条件的实体时返回None
+	def nearest_entity(self, center: Optional[MapLocation] = None, teams: Optional[List[Team]] = None, types: Optional[List[EntityType]] = None) -> Optional[EntityInfo]:
+		nearest = self.k_nearest_entities(1, center, teams, types)
+		return nearest[0] if nearest else None
+
 	# 探测一定范围内所有的实体
 	def detect_nearby_entities(self, radius: int) -> List[MapLocation]:
 		loc = []
@@ -180,6 +199,21 @@ class Controller:
 				loc.append(entity)
 		return loc
 
+	# 探测范围内与自身的欧几里得距离平方不超过radius的所有地图上的位置，默认为整个探测范围
+	def locations_within(self, radius: Optional[int] = None) -> Iterator[MapLocation]:
+		radius = self.get_type().detection_radius if radius is None else int(radius)
+		if radius < 0:
+			raise Exception("半径不能为负数。")
+		elif radius > self.get_type().detection_radius:
+			raise Exception("超出探测范围。")
+		loc = self.get_location()
+		include = self.__map.include
+		for dx, dy in disc_offsets(radius):
+			x = loc.x + dx
+			y = loc.y + dy
+			if include(x, y):
+				yield MapLocation(x, y)
+
 	# 感知指定位置的以太密度
 	def sense_aether(self, loc: MapLocation) -> float:
 		if loc.distance_to(self.get_location()) > self.get_type().sensor_radius:
@@ -188,8 +222,49 @@ class Controller:
 			raise Exception("目标不在地图上。")
 		return self.__map.get_aether(loc.x, loc.y)
 
+	# 一次感知指定半径内所有格子的以太密度，默认为整个感知范围
+	def sense_aether_nearby(self, radius: Optional[int] = None) -> List[Tuple[MapLocation, float]]:
+		radius = self.get_type().sensor_radius if radius is None else int(radius)
+		if radius < 0:
+			raise Exception("半径不能为负数。")
+		elif radius > self.get_type().sensor_radius:
+			raise Exception("超出感知范围。")
+		loc = self.get_location()
+		return [(MapLocation(x, y), aether) for x, y, aether in self.__map.get_aether_disc(loc.x, loc.y, radius)]
+
+	# 一次获得指定半径内每个格子上执行动作所需要的冷却，默认为整个感知范围
+	def sense_cooldown_nearby(self, radius: Optional[int] = None) -> List[Tuple[MapLocation, float]]:
+		base_cooldown = self.get_type().action_cooldown
+		return [(loc, base_cooldown / aether) for loc, aether in self.sense_aether_nearby(radius)]
+
+	# 沿以太加权的最短路径前往目标位置时下一步的方向。只考虑地图上未被阻挡的相邻格子，
+	# 已经在目标位置时返回center，无法移动时返回None。前往星球的时间场由引擎预先计算，其余目标的时间场在第一次使用时计算，
+	# 计算不受时间预算打断，之后按地图与目标缓存，所有实体共享
+	def direction_toward(self, target: MapLocation) -> Optional[Direction]:
+		gmap = self.__map
+		if not gmap.include(target.x, target.y):
+			raise Exception("目标不在地图上。")
+		loc = self.get_location()
+		if loc == target:
+			return Direction.center()
+		field = gmap.travel_times(target.x, target.y)
+		best = None
+		best_time = math.inf
+		for d in Direction.all_directions()[1:]:
+			x = loc.x + d.dx
+			y = loc.y + d.dy
+			if not gmap.include(x, y) or self.is_blocked(d):
+				continue
+			i = (x - gmap.dx) * gmap.height + (y - gmap.dy)
+			t = 1.0 / gmap.aether[i] + field[i]  # 进入相邻格子的时间加上从那里到达目标的时间
+			if t < best_time:
+				best = d
+				best_time = t
+		return best
+
 	# 是否有多少能量
 	def can_charge(self, energy: int) -> bool:
+		energy = int(energy)
 		return self.get_type() == "planet" and self.get_energy() >= energy >= 0
 
 	# 是否可以以指定的参数建造
@@ -199,7 +274,8 @@ class Controller:
 
 	# 是否可以在指定半径过载
 	def can_overdrive(self, radius: int) -> bool:
-		return self.get_type() == "destroyer" and radius <= self.get_type().action_radius and self.is_ready()
+		radius = int(radius)
+		return self.get_type() == "destroyer" and 0 <= radius <= self.get_type().action_radius and self.is_ready()
 
 	# 是否可以分析指定的ID或者指定的位置
 	def can_analyze(self, arg: Union[int, MapLocation]) -> bool:
@@ -221,6 +297,7 @@ class Controller:
 	# 是否可以改为指定广播值
 	@staticmethod
 	def can_set_radio(radio: int) -> bool:
+		radio = int(radio)
 		return 0 <= radio <= 2 ** 28 - 1
 
 	# 尝试充能
@@ -261,6 +338,7 @@ class Controller:
 
 	# 尝试过载
 	def overdrive(self, radius: int) -> None:
+		radius = int(radius)
 		if self.get_type() != "destroyer":
 			raise Exception("只有战列舰可以过载。")
 		if not self.can_overdrive(radius):
@@ -307,6 +385,7 @@ class Controller:
 
 	# 尝试设置广播内容
 	def set_radio(self, radio: int) -> None:
+		radio = int(radio)  # 广播值总是整数，回放与实体表都按整数存储
 		if not self.can_set_radio(radio):
 			raise Exception("广播值超出范围。")
 		else:
@@ -332,6 +411,9 @@ class Controller:
 		return self.__info, self.__cooldown, actions  # 所有需要更新的信息
 
 
+DISGUISE_TYPE = EntityType("destroyer")  # 开采舰在战列舰与开采舰眼中的伪装
+
+
 # 实体包装类
 class Entity:
 	def __init__(self, rtype: EntityType, energy: int, location: MapLocation, team: Team, cround: int, cplanet: Optional[int], rid: int) -> None:
@@ -340,20 +422,366 @@ class Entity:
 		self.created_round = cround
 		self.created_planet = cplanet  # 创造此实体的星球的ID
 	
-	def get_controller(self, all_entities: List[EntityInfo], teams_info: List[Team], charge_result: List[int], gmap: Map, round_count: int, overdrive_factor: List[list]) -> Controller:
+	# nearby为探测半径内的实体ID（按执行顺序排列），entity_count为本队在场的实体数
+	def get_controller(self, nearby: List[int], world: WorldSnapshot, entity_count: int, teams_info: List[Team], charge_result: List[int], gmap: Map, round_count: int, overdrive_ledger: OverdriveLedger) -> Controller:
+		info = self.info
 		sensed_entities = []
 		detected_entities = []
-		entity_cnt = 0
-		for entity in all_entities:  # 获得实体能感知和探测到的所有实体
-			if entity.team == self.info.team:
-				entity_cnt += 1
-			d = entity.location.distance_to(self.info.location)
-			if d <= self.info.type.detection_radius:
-				detected_entities.append(copy.deepcopy(entity.location))
-				if d <= self.info.type.sensor_radius:
-					new_entity = copy.deepcopy(entity)
-					if self.info.type in ["destroyer", "miner"] and entity.type == "miner" and entity.ID != self.info.ID:  # 非真实视野
-						new_entity.type = EntityType("destroyer")
-					sensed_entities.append(new_entity)
-
-		return Controller(self.info, sensed_entities, detected_entities, teams_info, charge_result[int(self.info.team.tag)], gmap, self.cooldown, round_count, overdrive_factor, entity_cnt)
\ No newline at end of file
+		disguise = info.type in ["destroyer", "miner"]
+		for rid in nearby:  # 获得实体能感知和探测到的所有实体
+			snapshot = world.get(rid)
+			d = snapshot.location.distance_to(info.location)
+			if d <= info.type.detection_radius:
+				detected_entities.append(snapshot.location)
+				if d <= info.type.sensor_radius:
+					if disguise and snapshot.type == "miner" and rid != info.ID:  # 非真实视野
+						snapshot = world.get_disguised(rid, DISGUISE_TYPE)
+					sensed_entities.append(snapshot)
+
+		return Controller(info, sensed_entities, detected_entities, teams_info, charge_result[int(info.team.tag)], gmap, self.cooldown, round_count, overdrive_ledger, entity_count)
+
+	# 复制实体，实体信息与位置也会被复制，修改副本不影响原来的实体
+	def copy(self) -> Entity:
+		entity = copy.copy(self)
+		info = entity.info = copy.copy(self.info)
+		info.location = MapLocation(info.location.x, info.location.y)
+		return entity
+
+
+# 写时复制的实体存储，可以代替以ID为键的Entity字典。多个分支共享同一个不再修改的base，
+# 每个分支只保存自己创建或修改过的实体。修改实体之前必须通过own取得本分支的副本
+class ForkedEntities:
+	def __init__(self, base: Mapping[int, Entity]) -> None:
+		self.base = base  # 分支之间共享的实体
+		self.local = {}  # 本分支创建或复制的实体
+		self.removed = set()  # base中已在本分支删除的实体
+		self.size = len(base)
+
+	# 取得可以修改的实体
+	def own(self, rid: int) -> Entity:
+		entity = self.local.get(rid)
+		if entity is None:
+			if rid in self.removed:
+				raise KeyError(rid)
+			entity = self.local[rid] = self.base[rid].copy()
+		return entity
+
+	# 是否与base完全相同，此时新的分支可以直接共享base
+	def is_pristine(self) -> bool:
+		return not self.local and not self.removed
+
+	def __setitem__(self, rid: int, entity: Entity) -> None:
+		if rid not in self:
+			self.size += 1
+		self.local[rid] = entity
+
+	def __getitem__(self, rid: int) -> Entity:
+		entity = self.local.get(rid)
+		if entity is not None:
+			return entity
+		if rid in self.removed:
+			raise KeyError(rid)
+		return self.base[rid]
+
+	def __delitem__(self, rid: int) -> None:
+		if rid not in self:
+			raise KeyError(rid)
+		self.local.pop(rid, None)
+		if rid in self.base:
+			self.removed.add(rid)
+		self.size -= 1
+
+	def __contains__(self, rid: int) -> bool:
+		return rid in self.local or (rid not in self.removed and rid in self.base)
+
+	def __len__(self) -> int:
+		return self.size
+
+	def __iter__(self) -> Iterator[int]:
+		yield from self.local
+		for rid in self.base:
+			if rid not in self.local and rid not in self.removed:
+				yield rid
+
+	def keys(self) -> Iterator[int]:
+		return iter(self)
+
+	def values(self) -> Iterator[Entity]:
+		return (self[rid] for rid in self)
+
+	def items(self) -> Iterator[Tuple[int, Entity]]:
+		return ((rid, self[rid]) for rid in self)
+
+
+ENTITY_TYPE_NAMES = ["destroyer", "miner", "scout", "planet"]  # 实体表中种类的编码顺序
+
+
+# 按列存储的实体表，可以代替以ID为键的Entity字典。每个实体占用一行，
+# 通过表取得的Entity与EntityInfo都是指向该行的视图，读写直接作用于对应的列
+class EntityTable:
+	COLUMNS = ("ID", "x", "y", "energy", "defence", "init_defence", "team", "type", "radio", "cooldown", "created_round", "created_planet", "generation")
+
+	def __init__(self) -> None:
+		self.ID = array("q")
+		self.x = array("q")
+		self.y = array("q")
+		self.energy = array("q")
+		self.defence = array("q")
+		self.init_defence = array("q")
+		self.team = array("b")  # 队伍tag，中立为-1
+		self.type = array("b")  # 在ENTITY_TYPE_NAMES中的序号
+		self.radio = array("q")
+		self.cooldown = array("d")
+		self.created_round = array("q")
+		self.created_planet = array("q")  # 没有母星时为-1
+		self.generation = array("q")  # 每行被复用的次数，视图以此判断所在的行是否已经属于其他实体
+		self.graves = {}  # (行号, 复用前的generation) -> 实体删除时的信息，供过期的视图使用
+		self.rows = {}  # 实体ID -> 行号
+		self.free = []  # 可以复用的行
+		self.released = []  # 本回合删除的实体的行，在recycle后才会被复用，保证删除后的视图在本回合内仍然可读
+		self.teams = {}  # 队伍编码 -> 共享的Team对象
+		self.types = [EntityType(name) for name in ENTITY_TYPE_NAMES]
+		self.type_codes = {name: i for i, name in enumerate(ENTITY_TYPE_NAMES)}
+
+	def encode_team(self, team: Team) -> int:
+		return -1 if team.tag == "Neutral" else int(team.tag)
+
+	def decode_team(self, code: int) -> Team:
+		team = self.teams.get(code)
+		if team is None:
+			team = self.teams[code] = Team("Neutral" if code == -1 else str(code))
+		return team
+
+	# 将实体信息写入指定行
+	def write_info(self, row: int, info: EntityInfo) -> None:
+		self.ID[row] = info.ID
+		self.x[row] = info.location.x
+		self.y[row] = info.location.y
+		self.energy[row] = info.energy
+		self.defence[row] = info.defence
+		self.init_defence[row] = info.init_defence
+		self.team[row] = self.encode_team(info.team)
+		self.type[row] = self.type_codes[info.type.name]
+		self.radio[row] = info.radio
+
+	def __setitem__(self, rid: int, entity: Entity) -> None:
+		if rid in self.rows:
+			del self[rid]
+		if self.free:
+			row = self.free.pop()
+		else:
+			row = len(self.ID)
+			for name in self.COLUMNS:
+				getattr(self, name).append(0)
+		self.write_info(row, entity.info)
+		self.cooldown[row] = entity.cooldown
+		self.created_round[row] = entity.created_round
+		self.created_planet[row] = -1 if entity.created_planet is None else entity.created_planet
+		self.rows[rid] = row
+
+	def __getitem__(self, rid: int) -> EntityRow:
+		return EntityRow(self, self.rows[rid])
+
+	def __delitem__(self, rid: int) -> None:
+		self.released.append(self.rows.pop(rid))
+
+	def __contains__(self, rid: int) -> bool:
+		return rid in self.rows
+
+	def __len__(self) -> int:
+		return len(self.rows)
+
+	def __iter__(self) -> Iterator[int]:
+		return iter(self.rows)
+
+	def keys(self) -> Iterator[int]:
+		return iter(self.rows)
+
+	def values(self) -> Iterator[EntityRow]:
+		return (EntityRow(self, row) for row in self.rows.values())
+
+	def items(self) -> Iterator[Tuple[int, EntityRow]]:
+		return ((rid, EntityRow(self, row)) for rid, row in self.rows.items())
+
+	# 允许复用已删除实体的行，每回合开始时调用
+	def recycle(self) -> None:
+		for row in self.released:
+			self.graves[row, self.generation[row]] = EntityInfoView(self, row).detach()
+			self.generation[row] += 1
+		self.free.extend(self.released)
+		self.released = []
+
+	# 复制整个表。各列是连续的数组，复制的开销很小
+	def copy(self) -> EntityTable:
+		table = copy.copy(self)
+		for name in self.COLUMNS:
+			setattr(table, name, array(getattr(self, name).typecode, getattr(self, name)))
+		table.rows = dict(self.rows)
+		table.free = list(self.free)
+		table.released = list(self.released)
+		table.graves = dict(self.graves)
+		table.teams = dict(self.teams)
+		return table
+
+
+# 实体表中一行的实体信息
+class EntityInfoView(EntityInfo):
+	__slots__ = ("table", "row", "generation")
+
+	def __init__(self, table: EntityTable, row: int) -> None:
+		self.table = table
+		self.row = row
+		self.generation = table.generation[row]
+
+	# 行已经被其他实体复用时，返回实体删除时保存的独立信息。玩家代码保留的过期视图读写的都是这份信息，
+	# 不会影响复用该行的实体，与字典存储中过期的实体信息一致
+	def grave(self) -> Optional[EntityInfo]:
+		if self.table.generation[self.row] == self.generation:
+			return None
+		return self.table.graves[self.row, self.generation]
+
+	@property
+	def ID(self) -> int:
+		grave = self.grave()
+		return self.table.ID[self.row] if grave is None else grave.ID
+
+	@property
+	def energy(self) -> int:
+		grave = self.grave()
+		return self.table.energy[self.row] if grave is None else grave.energy
+
+	@energy.setter
+	def energy(self, value: int) -> None:
+		grave = self.grave()
+		if grave is None:
+			self.table.energy[self.row] = value
+		else:
+			grave.energy = value
+
+	@property
+	def defence(self) -> int:
+		grave = self.grave()
+		return self.table.defence[self.row] if grave is None else grave.defence
+
+	@defence.setter
+	def defence(self, value: int) -> None:
+		grave = self.grave()
+		if grave is None:
+			self.table.defence[self.row] = value
+		else:
+			grave.defence = value
+
+	@property
+	def init_defence(self) -> int:
+		grave = self.grave()
+		return self.table.init_defence[self.row] if grave is None else grave.init_defence
+
+	@property
+	def location(self) -> MapLocation:
+		grave = self.grave()
+		return MapLocation(self.table.x[self.row], self.table.y[self.row]) if grave is None else grave.location
+
+	@location.setter
+	def location(self, value: MapLocation) -> None:
+		grave = self.grave()
+		if grave is None:
+			self.table.x[self.row] = value.x
+			self.table.y[self.row] = value.y
+		else:
+			grave.location = value
+
+	@property
+	def team(self) -> Team:
+		grave = self.grave()
+		return self.table.decode_team(self.table.team[self.row]) if grave is None else grave.team
+
+	@team.setter
+	def team(self, value: Team) -> None:
+		grave = self.grave()
+		if grave is None:
+			self.table.team[self.row] = self.table.encode_team(value)
+		else:
+			grave.team = value
+
+	@property
+	def type(self) -> EntityType:
+		grave = self.grave()
+		return self.table.types[self.table.type[self.row]] if grave is None else grave.type
+
+	@type.setter
+	def type(self, value: EntityType) -> None:
+		grave = self.grave()
+		if grave is None:
+			self.table.type[self.row] = self.table.type_codes[value.name]
+		else:
+			grave.type = value
+
+	@property
+	def radio(self) -> int:
+		grave = self.grave()
+		return self.table.radio[self.row] if grave is None else grave.radio
+
+	@radio.setter
+	def radio(self, value: int) -> None:
+		grave = self.grave()
+		if grave is None:
+			self.table.radio[self.row] = value
+		else:
+			grave.radio = value
+
+	def fields(self) -> dict:
+		return {"energy": self.energy, "defence": self.defence, "init_defence": self.init_defence, "ID": self.ID, "location": self.location, "team": self.team, "type": self.type, "radio": self.radio}
+
+	# 复制为独立的实体信息
+	def detach(self) -> EntityInfo:
+		return restore_info(self.fields())
+
+	def __copy__(self) -> EntityInfo:
+		return self.detach()
+
+	# 传输到其他进程时不再与表关联
+	def __reduce__(self) -> tuple:
+		return restore_info, (self.fields(),)
+
+
+def restore_info(fields: dict) -> EntityInfo:
+	info = EntityInfo.__new__(EntityInfo)
+	for key, value in fields.items():
+		setattr(info, key, value)
+	return info
+
+
+# 实体表中的一行
+class EntityRow(Entity):
+	__slots__ = ("table", "row")
+
+	def __init__(self, table: EntityTable, row: int) -> None:
+		self.table = table
+		self.row = row
+
+	@property
+	def info(self) -> EntityInfoView:
+		return EntityInfoView(self.table, self.row)
+
+	# 写入新的实体信息，例如玩家代码运行后控制器返回的信息
+	@info.setter
+	def info(self, value: EntityInfo) -> None:
+		if not (isinstance(value, EntityInfoView) and value.table is self.table and value.row == self.row and value.grave() is None):
+			self.table.write_info(self.row, value)
+
+	@property
+	def cooldown(self) -> float:
+		return self.table.cooldown[self.row]
+
+	@cooldown.setter
+	def cooldown(self, value: float) -> None:
+		self.table.cooldown[self.row] = value
+
+	@property
+	def created_round(self) -> int:
+		return self.table.created_round[self.row]
+
+	@property
+	def created_planet(self) -> Optional[int]:
+		planet = self.table.created_planet[self.row]
+		return None if planet == -1 else planet
\ No newline at end of file
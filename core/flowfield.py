@@ -0,0 +1,137 @@
+import os
+import sys
+import mmap
+import heapq
+import struct
+import hashlib
+from array import array
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# 以太加权的移动时间场。移动一步的冷却与移动后所在格子（即进入的格子）的以太密度成反比，
+# 因此到达某个目标的最短时间只由地图决定，可以在所有实体、回合以及使用同一地图的比赛之间共享。
+# 时间的单位为基础冷却为1时的冷却，乘以实体种类的action_cooldown即为实际的冷却。
+# 星球的时间场由引擎在加载地图时计算，保存在地图旁的<地图名>.flow中，同一台机器上的比赛与队伍进程通过内存映射共享；
+# 其余目标的时间场在玩家代码第一次使用时计算，缓存在进程中。
+# .flow文件结构：文件头 | 目标坐标（int32，x与y交替）| 按目标排列的时间场（小端float64，8字节对齐）
+MAX_CACHED_CELLS = 1 << 23  # 每个进程缓存的时间场的格子总数上限，每个格子8字节，约64MB
+FIELDS_MAGIC = b"CSFL"
+FIELDS_VERSION = 1
+_FIELDS_HEADER = struct.Struct("<4sH16sIII")  # 标识、版本、地图标识、宽、高、目标数
+_fields = OrderedDict()  # (地图标识, 目标x, 目标y) -> 时间场，按最近使用排序
+_cached_cells = 0
+
+
+# 地图的标识，由尺寸与以太密度决定，与地图的随机偏移无关
+def map_key(aether: Sequence[float], width: int, height: int) -> bytes:
+	digest = hashlib.blake2b(array("d", aether).tobytes(), digest_size=16)
+	digest.update(b"%d,%d" % (width, height))
+	return digest.digest()
+
+
+# 以目标格子为起点反向运行Dijkstra，得到每个格子（地图内坐标，x优先）到达目标的最短时间，
+# 包括进入目标格子的时间，不包括出发的格子本身。八个方向的移动代价相同
+def travel_field(aether: Sequence[float], width: int, height: int, tx: int, ty: int) -> array:
+	cost = [1.0 / a for a in aether]  # 进入该格子的时间
+	field = array("d", [float("inf")]) * (width * height)
+	start = tx * height + ty
+	field[start] = 0.0
+	heap = [(0.0, start)]
+	while heap:
+		t, i = heapq.heappop(heap)
+		if t > field[i]:
+			continue
+		x, y = divmod(i, height)
+		nt = t + cost[i]  # 从相邻的格子进入i
+		for nx in (x - 1, x, x + 1):
+			if nx < 0 or nx >= width:
+				continue
+			for ny in (y - 1, y, y + 1):
+				if ny < 0 or ny >= height:
+					continue
+				j = nx * height + ny
+				if nt < field[j]:
+					field[j] = nt
+					heapq.heappush(heap, (nt, j))
+	return field
+
+
+# 获得缓存的时间场，不存在时计算。缓存按格子总数限制大小，超出时移除最久未使用的时间场，但至少保留最新的一个
+def cached_travel_field(key: bytes, aether: Sequence[float], width: int, height: int, tx: int, ty: int) -> array:
+	global _cached_cells
+	cache_key = (key, tx, ty)
+	field = _fields.get(cache_key)
+	if field is None:
+		field = _fields[cache_key] = travel_field(aether, width, height, tx, ty)
+		_cached_cells += len(field)
+		while _cached_cells > MAX_CACHED_CELLS and len(_fields) > 1:
+			_cached_cells -= len(_fields.popitem(last=False)[1])
+	else:
+		_fields.move_to_end(cache_key)
+	return field
+
+
+def fields_path(map_path: str) -> str:
+	return os.path.splitext(map_path)[0] + ".flow"
+
+
+# 读取保存的时间场，结果为目标 -> 时间场（只读的内存视图）。文件不存在或者与地图不一致时返回空字典
+def read_fields(path: str, key: bytes, width: int, height: int) -> Dict[Tuple[int, int], Sequence[float]]:
+	try:
+		with open(path, "rb") as f:
+			if os.fstat(f.fileno()).st_size < _FIELDS_HEADER.size:
+				return {}
+			mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+	except (OSError, ValueError):
+		return {}
+	magic, version, file_key, file_width, file_height, count = _FIELDS_HEADER.unpack_from(mm, 0)
+	offset = _FIELDS_HEADER.size + 8 * count
+	offset += -offset % 8
+	if (magic, version, file_key, file_width, file_height) != (FIELDS_MAGIC, FIELDS_VERSION, key, width, height) or len(mm) != offset + 8 * count * width * height:
+		mm.close()
+		return {}
+	targets = array("i")
+	targets.frombytes(mm[_FIELDS_HEADER.size:_FIELDS_HEADER.size + 8 * count])
+	if sys.byteorder != "little":
+		targets.byteswap()
+	size = width * height
+	fields = {}
+	for n in range(count):
+		view = memoryview(mm)[offset + 8 * n * size:offset + 8 * (n + 1) * size]
+		if sys.byteorder == "little":
+			fields[targets[2 * n], targets[2 * n + 1]] = view.cast("d")
+		else:
+			field = array("d", view.tobytes())
+			field.byteswap()
+			fields[targets[2 * n], targets[2 * n + 1]] = field
+	return fields
+
+
+# 确保path中保存了所有目标的时间场，缺少时重新计算并写入。无法写入时返回False
+def prepare_fields(path: str, key: bytes, aether: Sequence[float], width: int, height: int, targets: List[Tuple[int, int]]) -> bool:
+	saved = read_fields(path, key, width, height)
+	if all(target in saved for target in targets):
+		return True
+	targets = sorted(set(targets) | set(saved))
+	header = _FIELDS_HEADER.pack(FIELDS_MAGIC, FIELDS_VERSION, key, width, height, len(targets))
+	coordinates = array("i", [c for target in targets for c in target])
+	if sys.byteorder != "little":
+		coordinates.byteswap()
+	tmp_path = "{}.{}.tmp".format(path, os.getpid())
+	try:
+		with open(tmp_path, "wb") as f:
+			f.write(header)
+			f.write(coordinates.tobytes())
+			f.write(b"\0" * (-(len(header) + 8 * len(targets)) % 8))
+			for tx, ty in targets:
+				field = saved.get((tx, ty))
+				field = travel_field(aether, width, height, tx, ty) if field is None else array("d", field)
+				if sys.byteorder != "little":
+					field.byteswap()
+				f.write(field.tobytes())
+		os.replace(tmp_path, path)  # 写入完成后再替换，并行的进程各自使用独立的临时文件
+	except OSError:  # 地图目录不可写时，时间场在使用时再计算
+		if os.path.exists(tmp_path):
+			os.remove(tmp_path)
+		return False
+	return True
@@ -1,63 +1,99 @@
-import importlib
 import random
 import math
 import time
+import copy
 import json
 import os
 from tqdm import tqdm
-from typing import List, Tuple, Optional
+from typing import List, Tuple, Optional, Union
 
 from core.api import *
-from core.entity import Entity, Controller
-from core.classes import Map
+from core.entity import Entity, Controller, EntityTable, ForkedEntities
+from core.classes import Map, SpatialGrid, WorldSnapshot, OverdriveLedger
+from core.mapcache import load_map
+from core.flowfield import fields_path, prepare_fields
+from core.profiler import TurnProfiler
+from core.budget import TurnBudget
+from core.replay import REPLAY_EXTENSIONS, open_replay_writer, resume_replay_writer
+from core.checkpoint import write_checkpoint, read_checkpoint
+from core.worker import LocalTeam, TeamWorker, TeamError, restore_random
+
+
+ACTION_KINDS = ["create", "charge", "overdrive", "analyze"]  # 控制器记录的行动种类
 
 
 # 定义比赛示例的类
 class Instance:
-	def __init__(self, teams: List[str], map_path: str, game_round: int, debug: bool = False, show_progress: bool = True) -> None:
+	def __init__(self, teams: List[str], map_path: str, game_round: int, debug: bool = False, show_progress: bool = True, replay_format: str = "json", profile: bool = False, profile_in_replay: bool = False,
+			turn_time_limit: Optional[float] = None, team_time_limit: Optional[float] = None, team_workers: bool = False, worker_memory_limit: Optional[int] = None,
+			worker_timeout: Optional[float] = None, entity_table: bool = False, checkpoint_interval: Optional[int] = None) -> None:
+		self.options = {"teams": list(teams), "map_path": map_path, "game_round": game_round, "debug": debug, "show_progress": show_progress, "replay_format": replay_format,
+			"profile": profile, "profile_in_replay": profile_in_replay, "turn_time_limit": turn_time_limit, "team_time_limit": team_time_limit, "team_workers": team_workers,
+			"worker_memory_limit": worker_memory_limit, "worker_timeout": worker_timeout, "entity_table": entity_table, "checkpoint_interval": checkpoint_interval}  # 从检查点恢复时使用
 		self.team_names = teams
+		self.rng = random.Random(random.getrandbits(64))  # 引擎独立的随机数生成器，不受玩家代码影响
 		self.game_round = game_round
 		self.show_progress = show_progress
 		self.round = 0
 		self.map = None
-		self.entities = {}  # 所有的实体
-		self.available_entities_ids = []  # 还在场上的实体的ID
-		self.deleted_entities_ids = []  # 本轮已经删除的实体的ID
+		self.entities = EntityTable() if entity_table else {}  # 所有的实体，以ID为键。可以使用按列存储的实体表以节省内存
+		self.available_entities_ids = {}  # 还在场上的实体的ID，按执行顺序排列。值无意义，仅作为有序集合使用
+		self.deleted_entities_ids = set()  # 本轮已经删除的实体的ID
+		self.id_range = 99999  # 实体ID的上限，实体数量增长时自动扩大
+		self.grid = SpatialGrid()  # 在场实体的空间索引
+		self.execution_order = {}  # 在场实体在本轮执行顺序中的位置
+		self.team_entity_count = {}  # 每个队伍在场的实体数
+		self.world = WorldSnapshot(lambda rid: self.entities[rid].info)  # 在场实体的只读快照，随实体状态的改变增量更新
 		self.charge_result = [0] * len(teams)  # 存储充能结果的对象
 		self.charge_list = []
-		self.overdrive_factor = []  # 过载加成系数，[队伍tag，能量，过期轮数]
+		self.action_counts = {action: [0] * len(teams) for action in ACTION_KINDS}  # 各队伍执行每种行动的次数，写入回放的结果中
+		self.overdrive_ledger = OverdriveLedger()  # 各队伍的过载加成记录
 		self.planet_list = []  # 存储所有星球的索引
 		self.all_teams = []
-		self.replay = {"rounds": []}  # 保存回放的对象。应为{map:[], rounds:[], winner:"", reason:""}
-		self.entity_instances = {}  # 存储实体实例的字典
-		self.team_instances = []
-		for team in teams:  # 导入玩家的代码
-			self.team_instances.append(importlib.import_module(f"src.{team}.main"))
+		self.replay = {}  # 回放中除回合以外的内容。应为{map:[], winner:"", reason:""}
+		self.replay_writer = None  # 回合数据直接写入回放文件
+		self.replay_format = replay_format  # 回放格式，json或者delta
+		self.teams = []  # 运行各个队伍代码的对象，持有该队伍所有实体的玩家实例
+		for team in teams:  # 每个队伍使用独立的随机数种子
+			self.teams.append(self.new_team(team, self.rng.getrandbits(64)))
 
 		self.init_map(map_path)  # 初始化地图
-		self.replay_path = "./replays/replays-{}.rpl".format(int(time.time()))  # 回放存储的位置
+		for team in self.teams:
+			team.set_map(self.map)
+		restore_random()
+		self.replay_path = "./replays/replays-{}.{}".format(int(time.time()), REPLAY_EXTENSIONS[replay_format])  # 回放存储的位置
 		self.debug = debug
 		self.game_end_flag = False
+		self.winner = None  # 胜者在team_names中的序号，平局时为None
+		self.profiler = TurnProfiler(teams) if profile else None  # 统计玩家代码的耗时，关闭时为None
+		self.profile_in_replay = profile_in_replay  # 是否将耗时统计写入回放
+		self.budget = None  # 玩家代码的时间预算，未设置时为None
+		if turn_time_limit is not None or team_time_limit is not None:
+			self.budget = TurnBudget(turn_time_limit, team_time_limit)
+		self.checkpoint_interval = checkpoint_interval  # 每隔多少回合保存一次检查点，未设置时为None
+
+	def new_team(self, name: str, seed: int) -> Union[LocalTeam, TeamWorker]:
+		if self.options["team_workers"]:
+			return TeamWorker(name, seed, self.options["worker_memory_limit"], self.options["worker_timeout"])
+		return LocalTeam(name, seed)
 
 	# 计算过载系数
 	def get_overdrive_factor(self, team: Team) -> float:
-		index = 0
-		for i in self.overdrive_factor:
-			if i[0] == team.tag and i[2] > self.round:  # 如果是同一队并且过期轮数大于当前轮数，则累加
-				index += i[1]
+		index = self.overdrive_ledger.total(team.tag, self.round)  # 同一队过期轮数大于当前轮数的能量之和
 		return (1.0 + 0.001) ** min(1145, index)
 
 	def init_map(self, map_path: str) -> None:
-		f = open(map_path, "r", encoding="utf-8")
-		fmap = json.loads(f.read())  # 读取json格式的地图
-		f.close()
+		fmap = load_map(map_path)  # 读取地图，优先使用编译后的缓存
 
 		if len(self.team_names) != fmap["players"]:  # 检查地图配置
 			raise Exception("地图配置与玩家数量不匹配。")
 
-		dx = random.randint(-300, 300)
-		dy = random.randint(-300, 300)  # 随机偏移
-		self.map = Map(fmap["map"], fmap["map_size"], dx, dy)  # 初始化地图对象
+		dx = self.rng.randint(-300, 300)
+		dy = self.rng.randint(-300, 300)  # 随机偏移
+		self.map = Map.from_array(fmap["aether"], fmap["map_size"], dx, dy)  # 初始化地图对象
+		targets = [(planet["x"], planet["y"]) for planet in fmap["planets"]]  # 预先计算前往各个星球的时间场，不占用玩家代码的时间
+		if prepare_fields(fields_path(map_path), self.map.get_key(), self.map.aether, self.map.width, self.map.height, targets):
+			self.map.fields_path = fields_path(map_path)
 		self.replay["map"] = self.map.to_dict()  # 获得地图信息
 		for planet in fmap["planets"]:  # 生成初始星球实体
 			if planet["team"] not in self.all_teams:  # 保存所有队伍
@@ -67,26 +103,58 @@ class Instance:
 	def add_entity(self, entity_type: EntityType, energy: int, location: MapLocation, team: Team, planet: Optional[int] = None) -> int:
 		if not self.map.include(*location.to_tuple()):
 			raise Exception("尝试在地图外生成实体。")
-		rid = random.randint(10000, 99999)
-		while str(rid) in list(self.entities.keys()):  # 生成唯一ID
-			rid = random.randint(10000, 99999)
-
-		self.entities[str(rid)] = Entity(entity_type, energy, location, team, self.round, planet, rid)  # 添加新的实体
-		self.available_entities_ids.append(rid)
+		rid = self.new_entity_id()
+		self.entities[rid] = Entity(entity_type, energy, location, team, self.round, planet, rid)  # 添加新的实体
+		self.execution_order[rid] = len(self.execution_order)
+		self.available_entities_ids[rid] = None
+		self.grid.insert(rid, location.x, location.y)
+		self.team_entity_count[team.tag] = self.team_entity_count.get(team.tag, 0) + 1
 		if team != "Neutral":
-			self.entity_instances[str(rid)] = self.team_instances[int(team.tag)].Player()  # 对应队伍的实例
+			self.teams[int(team.tag)].spawn(rid)  # 对应队伍的实例
+		return rid
+
+	# 生成随机的唯一ID。保持ID空间中至少一半空闲，期望的尝试次数不超过两次
+	def new_entity_id(self) -> int:
+		if len(self.entities) * 2 > self.id_range - 10000:
+			self.id_range = self.id_range * 10 + 9
+		rid = self.rng.randint(10000, self.id_range)
+		while rid in self.entities:
+			rid = self.rng.randint(10000, self.id_range)
 		return rid
 
 	def remove_entity(self, entity_id: int) -> None:
-		self.available_entities_ids.remove(entity_id)
-		self.deleted_entities_ids.append(entity_id)
-		del self.entities[str(entity_id)]
-		del self.entity_instances[str(entity_id)]
+		del self.available_entities_ids[entity_id]
+		self.deleted_entities_ids.add(entity_id)
+		self.grid.remove(entity_id)
+		self.world.invalidate(entity_id)
+		team = self.entities[entity_id].info.team
+		self.team_entity_count[team.tag] -= 1
+		del self.entities[entity_id]
+		if team != "Neutral":
+			self.teams[int(team.tag)].drop(entity_id)
+
+	# 获取将要被修改的实体，同时使其快照失效。分支共享的实体会先被复制
+	def edit_entity(self, entity_id: int) -> Entity:
+		self.world.invalidate(entity_id)
+		if isinstance(self.entities, ForkedEntities):
+			return self.entities.own(entity_id)
+		return self.entities[entity_id]
+
+	def convert_entity(self, entity_id: int, team: Team) -> None:
+		entity = self.edit_entity(entity_id)
+		self.team_entity_count[entity.info.team.tag] -= 1
+		self.team_entity_count[team.tag] = self.team_entity_count.get(team.tag, 0) + 1
+		if entity.info.team != "Neutral":
+			self.teams[int(entity.info.team.tag)].drop(entity_id)
+		entity.info.team = team
+		if team != "Neutral":
+			self.teams[int(team.tag)].spawn(entity_id)  # 对应队伍的实例
 
 	# 管理全局回合的方法。
 	def run(self) -> Tuple[str, str, str]:
-		self.new_replay()  # 初始化
-		looper = range(self.game_round)
+		if self.round == 0:
+			self.new_replay()  # 初始化
+		looper = range(self.round, self.game_round)  # 从检查点恢复时从中间开始
 		if self.show_progress:
 			looper = tqdm(looper)
 			
@@ -96,6 +164,8 @@ class Instance:
 			self.next_round()
 			if self.game_end_flag:
 				return self.replay["winner"], self.replay["reason"], self.replay_path
+			if self.checkpoint_interval and self.round % self.checkpoint_interval == 0 and self.round < self.game_round:
+				self.save_checkpoint()
 
 		self.counting_result()  # 统计比赛数据
 
@@ -104,103 +174,151 @@ class Instance:
 	def next_round(self) -> None:
 		self.round += 1
 		self.charge_list = []  # 星球充能列表
-		self.deleted_entities_ids = []  # 重置删除实体列表
-		random.shuffle(self.available_entities_ids)  # 打乱实体的执行顺序
+		self.deleted_entities_ids = set()  # 重置删除实体列表
+		self.overdrive_ledger.expire(self.round)  # 移除已经过期的过载加成
+		if isinstance(self.entities, EntityTable):
+			self.entities.recycle()
+		order = list(self.available_entities_ids)
+		self.rng.shuffle(order)  # 打乱实体的执行顺序
+		self.available_entities_ids = dict.fromkeys(order)
+		self.execution_order = {rid: i for i, rid in enumerate(order)}
+		if self.profiler is not None:
+			self.profiler.begin_round(self.round)
+		if self.budget is not None:
+			self.budget.begin_round(self.round)
+
+		self.planet_income()
+		self.run_entities()
+		self.end_round_check()  # 一轮最末尾进行检查，判断游戏是否结束，计算全局变量
+		if self.profiler is not None:
+			self.profiler.end_round()  # 回合检查与保存回放也计入引擎开销
 
+	def planet_income(self) -> None:
 		for p in self.planet_list:
-			if self.entities[str(p)].info.team != "Neutral":
-				self.entities[str(p)].info.energy += math.ceil(0.2 * math.sqrt(self.round))  # 给每个星球增加资源点
+			if self.entities[p].info.team != "Neutral":
+				self.edit_entity(p).info.energy += math.ceil(0.2 * math.sqrt(self.round))  # 给每个星球增加资源点
 
-		for rid in self.available_entities_ids.copy():  # 分别运行还在场上的所有实体
+	def run_entities(self) -> None:
+		for rid in list(self.available_entities_ids):  # 分别运行还在场上的所有实体
 			if rid in self.deleted_entities_ids:  # 如果实体已经被删除
 				continue
-			if self.entities[str(rid)].info.team != "Neutral":  # 忽略中立的实体
-				self.entities[str(rid)].cooldown = max(self.entities[str(rid)].cooldown-1, 0)  # 减少冷却
+			if self.entities[rid].info.team != "Neutral":  # 忽略中立的实体
+				entity = self.edit_entity(rid)
+				entity.cooldown = max(entity.cooldown-1, 0)  # 减少冷却
 				if self.debug:
 					self.run_instance(rid)
 				else:
 					try:
 						self.run_instance(rid)
 					except Exception as err:
-						print("[Team {}] {}".format(self.entities[str(rid)].info.team, err))
-		self.end_round_check()  # 一轮最末尾进行检查，判断游戏是否结束，计算全局变量
+						print("[Team {}] {}".format(self.entities[rid].info.team, err))
+		for team in self.teams:  # 发送本轮剩余的实体增删
+			team.flush()
+		restore_random()
 
 	def run_instance(self, entity_id: int) -> None:
-		entity = self.entities[str(entity_id)]  # 获取实体
-		all_entities = []
-		for rid in self.available_entities_ids:  # 获取当前的在场实体
-			all_entities.append(self.entities[str(rid)].info)
-
-		controller = entity.get_controller(all_entities, self.all_teams, self.charge_result, self.map, self.round, self.overdrive_factor)  # 获取控制器，传入副本
-		controller = self.entity_instances[str(entity_id)].run(controller)  # 运行玩家实例
-		self.end_instance_check(entity_id, controller)  # 玩家行动后进行检查，更新全局与本地实体状态
-
-	def end_instance_check(self, entity_id: int, controller: Controller) -> None:
-		self.entities[str(entity_id)].info, self.entities[str(entity_id)].cooldown, actions = controller.get_actions()  # 更新本地实体状态
-		local_info = self.entities[str(entity_id)].info
+		entity = self.edit_entity(entity_id)  # 获取实体，玩家代码会直接修改实体信息
+		location = entity.info.location
+		nearby = self.grid.query(location.x, location.y, entity.info.type.detection_radius)  # 只查询探测范围覆盖的格子
+		nearby.sort(key=self.execution_order.__getitem__)  # 保持与执行顺序一致
+
+		backup = None
+		if self.budget is not None:  # 超出预算时整个回合作废，恢复回合开始时的实体信息
+			backup = copy.copy(entity.info)
+			backup.location = MapLocation(backup.location.x, backup.location.y)
+
+		controller = entity.get_controller(nearby, self.world, self.team_entity_count[entity.info.team.tag], self.all_teams, self.charge_result, self.map, self.round, self.overdrive_ledger)  # 获取控制器
+		try:
+			if self.budget is None:
+				result = self.run_player(entity_id, controller)  # 运行玩家实例
+			else:
+				result = self.budget.run(lambda: self.run_player(entity_id, controller), backup)
+				if result is None:
+					entity.info = backup
+			if result is not None:
+				entity.info = result[0]  # 队伍进程返回的是新的实体信息，需要在更新网格之前写回
+		except TeamError as err:
+			if err.info is not None:  # 同步队伍进程中玩家代码已经做出的修改
+				entity.info = err.info
+			raise
+		finally:
+			self.grid.move(entity_id, *entity.info.location.to_tuple())  # 玩家代码可能已经移动了实体
+			self.world.invalidate(entity_id)  # 玩家代码可能已经修改了实体
+		if result is not None:
+			self.end_instance_check(entity_id, result)  # 玩家行动后进行检查，更新全局与本地实体状态
+
+	# 运行玩家实例，返回控制器记录的(实体信息, 冷却, 行动)
+	def run_player(self, entity_id: int, controller: Controller) -> Tuple[EntityInfo, float, List[list]]:
+		info = self.entities[entity_id].info
+		team = self.teams[int(info.team.tag)]
+		if self.profiler is None:
+			return team.run(entity_id, controller)
+		return self.profiler.run(lambda: team.run(entity_id, controller), info)
+
+	def end_instance_check(self, entity_id: int, result: Tuple[EntityInfo, float, List[list]]) -> None:
+		entity = self.edit_entity(entity_id)
+		entity.info, entity.cooldown, actions = result  # 更新本地实体状态
+		local_info = entity.info
 		for action in actions:
+			self.action_counts[action[0]][int(local_info.team.tag)] += 1
 			if action[0] == "create":  # 创造新的实体，参数为(type, dir, energy)
 				_ = self.add_entity(action[1][0], action[1][2], local_info.location.add(action[1][1]), local_info.team, local_info.ID)
 			elif action[0] == "charge":  # 充能，参数为 energy
 				self.charge_list.append((entity_id, action[1]))  # 保存id，等到回合结束后比较
 			elif action[0] == "overdrive":  # 过载，参数为 radius
 				self.remove_entity(entity_id)  # 过载后删除本实体
-				targets = []
-				for rid in self.available_entities_ids:  # 选出所有在半径内的实体
-					if self.entities[str(rid)].info.location.distance_to(local_info.location) <= action[1]:
-						targets.append(rid)
+				location = local_info.location
+				targets = self.grid.query(location.x, location.y, action[1])  # 选出所有在半径内的实体
 				if len(targets) != 0 and local_info.defence > 10:  # 注意，过载应该是以防护值为基础值
-					base_energy = (local_info.defence - 10) / len(targets)  # 均分能量
-					odfactor = self.get_overdrive_factor(local_info.team)  # 获得当前增益系数
-					for rid in targets:  # 依次处理
-						entity_info = self.entities[str(rid)].info
-						if entity_info.team == local_info.team:  # 友军的场合
-							if entity_info.type == "planet":
-								self.entities[str(rid)].info.energy += int(base_energy * odfactor)
-							else:
-								self.entities[str(rid)].info.defence += int(base_energy * odfactor)
-								self.entities[str(rid)].info.defence = min(self.entities[str(rid)].info.defence, entity_info.init_defence)  # 限制上限
-						else:  # 非友军的场合
-							if entity_info.type == "planet":
-								self.entities[str(rid)].info.energy -= int(base_energy * odfactor)
-								if self.entities[str(rid)].info.energy < 0:  # 如果能量值小于零
-									self.entities[str(rid)].info.energy = -self.entities[str(rid)].info.energy  # 新实体能量值等于绝对值
-									self.entities[str(rid)].info.team = local_info.team  # 转换队伍
-									self.entity_instances[str(rid)] = self.team_instances[int(local_info.team.tag)].Player()  # 对应队伍的实例
-							else:
-								self.entities[str(rid)].info.defence -= int(base_energy * odfactor)
-								if entity_info.type == "destroyer":
-									if self.entities[str(rid)].info.defence < 0:  # 如果防护值小于零
-										self.entities[str(rid)].info.defence = -self.entities[str(rid)].info.defence  # 新实体防护值等于绝对值
-										self.entities[str(rid)].info.defence = min(self.entities[str(rid)].info.defence, entity_info.init_defence)  # 限制上限
-										self.entities[str(rid)].info.team = local_info.team  # 转换队伍
-										self.entity_instances[str(rid)] = self.team_instances[int(local_info.team.tag)].Player()  # 对应队伍的实例
-									elif self.entities[str(rid)].info.defence == 0:
-										self.remove_entity(entity_info.ID)
-								else:
-									if self.entities[str(rid)].info.defence <= 0:  # 如果防护值小于零
-										self.remove_entity(entity_info.ID)  # 删除实体
+					amount = int((local_info.defence - 10) / len(targets) * self.get_overdrive_factor(local_info.team))  # 均分能量，乘以当前增益系数
+					targets.sort(key=self.execution_order.__getitem__)  # 按执行顺序依次处理
+					for rid in targets:
+						self.overdrive_entity(rid, local_info.team, amount)
 
 			elif action[0] == "analyze":  # 分析，参数为 target
 				if action[1].type == "miner" and action[1].team != local_info.team:
 					self.remove_entity(action[1].ID)  # 删除实体
-					self.overdrive_factor.append((local_info.team.tag, action[1].energy, self.round + 50))  # 增加增益
+					self.overdrive_ledger.add(local_info.team.tag, action[1].energy, self.round + 50)  # 增加增益
 
 		if local_info.type == "miner":  # 开采舰的场合
-			if self.round >= self.entities[str(entity_id)].created_round + 50:  # 如果已经超过了50回合
-				created_planet_index = str(self.entities[str(entity_id)].created_planet)
+			if self.round >= entity.created_round + 50:  # 如果已经超过了50回合
+				created_planet_index = entity.created_planet
 				if self.entities[created_planet_index].info.team == local_info.team:  # 如果母星仍然属于本队
-					self.entities[created_planet_index].info.energy += math.floor((0.02 + 0.03 * math.e ** (-0.001 * local_info.energy)) * local_info.energy)  # 增加资源
+					self.edit_entity(created_planet_index).info.energy += math.floor((0.02 + 0.03 * math.e ** (-0.001 * local_info.energy)) * local_info.energy)  # 增加资源
+
+	# 过载对单个实体的效果，amount为该实体分得的能量
+	def overdrive_entity(self, entity_id: int, team: Team, amount: int) -> None:
+		info = self.edit_entity(entity_id).info
+		if info.team == team:  # 友军的场合
+			if info.type == "planet":
+				info.energy += amount
+			else:
+				info.defence = min(info.defence + amount, info.init_defence)  # 限制上限
+		elif info.type == "planet":
+			info.energy -= amount
+			if info.energy < 0:  # 如果能量值小于零
+				info.energy = -info.energy  # 新实体能量值等于绝对值
+				self.convert_entity(entity_id, team)  # 转换队伍
+		else:
+			info.defence -= amount
+			if info.type == "destroyer":
+				if info.defence < 0:  # 如果防护值小于零
+					info.defence = min(-info.defence, info.init_defence)  # 新实体防护值等于绝对值，限制上限
+					self.convert_entity(entity_id, team)  # 转换队伍
+				elif info.defence == 0:
+					self.remove_entity(entity_id)
+			elif info.defence <= 0:  # 如果防护值小于零
+				self.remove_entity(entity_id)  # 删除实体
 
 	def end_round_check(self) -> None:  # 处理开采舰是否进化、计算充能，判断游戏是否结束。
 		alive_team = []
 		for rid in self.available_entities_ids:
-			entity = self.entities[str(rid)]  # 遍历剩余实体
+			entity = self.entities[rid]  # 遍历剩余实体
 			if entity.info.team not in alive_team:  # 获得还有实体在场的队伍Tag
 				alive_team.append(entity.info.team)
 			if entity.info.type == "miner":  # 判断进化
 				if self.round >= entity.created_round + 300:
-					self.entities[str(rid)].info.type = EntityType("destroyer")
+					self.edit_entity(rid).info.type = EntityType("destroyer")
 
 		self.new_replay()  # 保存录像
 		if len(alive_team) <= 1:
@@ -217,9 +335,9 @@ class Instance:
 
 		for c in self.charge_list:
 			if len(max_planet) == 1 and max_planet[0] == c[0]:  # 唯一最大值的场合
-				self.charge_result[int(self.entities[str(c[0])].info.team.tag)] += 1  # 充能结果加一
+				self.charge_result[int(self.entities[c[0]].info.team.tag)] += 1  # 充能结果加一
 			else:
-				self.entities[str(c[0])].info.energy += math.floor(c[1] / 2)  # 返还一半的能量
+				self.edit_entity(c[0]).info.energy += math.floor(c[1] / 2)  # 返还一半的能量
 
 	# 计算比赛结果的方法
 	def counting_result(self) -> None:
@@ -233,7 +351,7 @@ class Instance:
 		else:
 			team_planet_count = [0] * len(self.charge_result)  # 与队伍数等长的对象
 			for p in self.planet_list:
-				team_planet_count[int(self.entities[str(p)].info.team.tag)] += 1
+				team_planet_count[int(self.entities[p].info.team.tag)] += 1
 			most_planet = max(team_planet_count)  # 最多的星球数
 			most_planet_team = []
 			for i, c in enumerate(team_planet_count):  # 遍历
@@ -257,18 +375,176 @@ class Instance:
 
 	# 保存这一回合至回放中
 	def new_replay(self) -> None:
-		self.replay["rounds"].append([self.entities[str(rid)].info.to_dict() for rid in self.available_entities_ids])
+		if self.replay_path is None:  # 不记录回放的分支
+			return
+		if self.replay_writer is None:  # 第一回合时创建回放文件
+			self.replay_writer = open_replay_writer(self.replay_format, self.replay_path, self.replay["map"])
+		self.replay_writer.write_round([self.entities[rid].info.to_dict() for rid in self.available_entities_ids])
 
 	def save_replay(self) -> None:
-		os.makedirs(os.path.dirname(self.replay_path), exist_ok=True)
-		with open(self.replay_path, "w", encoding="utf-8") as f:
-			f.write(json.dumps(self.replay))
+		if self.replay_path is None:
+			return
+		if self.replay_writer is None:
+			self.replay_writer = open_replay_writer(self.replay_format, self.replay_path, self.replay["map"])
+		fields = {"winner": self.replay["winner"], "reason": self.replay["reason"], "teams": self.team_names, "actions": self.action_counts}
+		if self.profiler is not None and self.profile_in_replay:
+			fields["profile"] = self.profiler.report()
+		if self.budget is not None:
+			fields["budget"] = self.budget.summary()
+		self.replay_writer.close(**fields)
+
+	# 保存玩家代码的耗时统计，与回放存放在同一位置
+	def save_profile(self) -> str:
+		path = os.path.splitext(self.replay_path)[0] + ".profile.json"
+		with open(path, "w", encoding="utf-8") as f:
+			f.write(json.dumps(self.profiler.report()))
+		return path
+
+	# 在回合之间保存检查点，默认与回放存放在同一位置。检查点包含引擎的全部状态、回放的写入位置，
+	# 以及各队伍的随机数状态与可以序列化的玩家实例。耗时统计与时间预算不会被保存
+	def save_checkpoint(self, path: Optional[str] = None) -> str:
+		if path is None:
+			path = os.path.splitext(self.replay_path)[0] + ".ckpt"
+		write_checkpoint(path, self.checkpoint_state())
+		return path
+
+	# 检查点的内容，也用于在其他进程中重建比赛
+	def checkpoint_state(self) -> dict:
+		teams = []
+		for team in self.teams:
+			try:
+				teams.append(team.get_state())
+			except TeamError:  # 队伍进程已经退出
+				teams.append(None)
+		return {
+			"options": self.options,
+			"map": {"key": self.map.get_key(), "origin": (self.map.dx, self.map.dy)},
+			"round": self.round,
+			"rng": self.rng.getstate(),
+			"entities": self.entities,
+			"available": list(self.available_entities_ids),
+			"id_range": self.id_range,
+			"team_entity_count": self.team_entity_count,
+			"charge_result": self.charge_result,
+			"action_counts": self.action_counts,
+			"overdrive_ledger": self.overdrive_ledger,
+			"planet_list": self.planet_list,
+			"all_teams": self.all_teams,
+			"replay_path": self.replay_path,
+			"replay_writer": self.replay_writer.checkpoint() if self.replay_writer is not None else None,
+			"teams": teams,
+		}
+
+	# 从检查点创建比赛，options可以覆盖创建比赛时的参数，例如show_progress
+	@classmethod
+	def resume(cls, path: str, **options: object) -> "Instance":
+		state = read_checkpoint(path)
+		kwargs = dict(state["options"])
+		kwargs.update(options)
+		game = cls(**kwargs)
+		game.restore_checkpoint(state)
+		return game
+
+	def restore_checkpoint(self, state: dict) -> None:
+		if state["map"]["key"] != self.map.get_key():
+			raise Exception("地图与检查点不匹配。")
+		fields = self.map.fields_path
+		self.map = Map.from_array(self.map.aether, (self.map.width, self.map.height), *state["map"]["origin"])
+		self.map.fields_path = fields
+		self.replay["map"] = self.map.to_dict()
+		self.round = state["round"]
+		self.rng.setstate(state["rng"])
+		self.entities = state["entities"]
+		self.available_entities_ids = dict.fromkeys(state["available"])
+		self.deleted_entities_ids = set()
+		self.id_range = state["id_range"]
+		self.execution_order = {rid: i for i, rid in enumerate(self.available_entities_ids)}
+		self.grid = SpatialGrid()
+		for rid in self.available_entities_ids:
+			location = self.entities[rid].info.location
+			self.grid.insert(rid, location.x, location.y)
+		self.team_entity_count = state["team_entity_count"]
+		self.world = WorldSnapshot(lambda rid: self.entities[rid].info)
+		self.charge_result = state["charge_result"]
+		self.action_counts = state["action_counts"]
+		self.overdrive_ledger = state["overdrive_ledger"]
+		self.planet_list = state["planet_list"]
+		self.all_teams = state["all_teams"]
+		self.replay_path = state["replay_path"]
+		for i, (team, team_state) in enumerate(zip(self.teams, state["teams"])):
+			team.set_map(self.map)
+			if team_state is None:  # 保存时队伍进程已经退出，重新创建所有玩家实例
+				team_state = {"random": None, "players": {rid: None for rid in self.available_entities_ids if self.entities[rid].info.team.tag == str(i)}}
+			team.set_state(team_state)
+		restore_random()
+		if state["replay_writer"] is not None:
+			self.replay_writer = resume_replay_writer(self.replay_format, self.replay_path, state["replay_writer"])
+
+	# 从当前回合创建比赛的分支。分支与原比赛共享地图和未修改的实体，实体在第一次被修改时才会复制。
+	# seed为分支的随机数种子，未设置时分支与原比赛的后续完全相同；teams可以替换各个座位的队伍代码，
+	# 被替换的队伍会重新创建所有玩家实例；replay_path为None时分支不记录回放，否则回放从分支处开始
+	def fork(self, seed: Optional[int] = None, teams: Optional[List[str]] = None, replay_path: Optional[str] = None) -> "Instance":
+		teams = list(teams) if teams is not None else list(self.team_names)
+		if len(teams) != len(self.team_names):
+			raise Exception("地图配置与玩家数量不匹配。")
+		branch = copy.copy(self)  # 地图等不会被修改的对象直接共享
+		branch.options = dict(self.options, teams=teams, checkpoint_interval=None)
+		branch.team_names = teams
+		if isinstance(self.entities, EntityTable):
+			branch.entities = self.entities.copy()
+		else:  # 当前的实体从此不再修改，两个分支各自记录之后的修改
+			base = self.entities.base if isinstance(self.entities, ForkedEntities) and self.entities.is_pristine() else self.entities
+			self.entities = ForkedEntities(base)
+			branch.entities = ForkedEntities(base)
+		branch.available_entities_ids = dict(self.available_entities_ids)
+		branch.deleted_entities_ids = set(self.deleted_entities_ids)
+		branch.grid = self.grid.copy()
+		branch.execution_order = dict(self.execution_order)
+		branch.team_entity_count = dict(self.team_entity_count)
+		branch.world = WorldSnapshot(lambda rid: branch.entities[rid].info)
+		branch.charge_result = list(self.charge_result)
+		branch.action_counts = {action: list(counts) for action, counts in self.action_counts.items()}
+		branch.charge_list = list(self.charge_list)
+		branch.overdrive_ledger = self.overdrive_ledger.copy()
+		branch.planet_list = list(self.planet_list)
+		branch.all_teams = list(self.all_teams)
+		branch.replay = dict(self.replay)
+		branch.replay_writer = None
+		branch.replay_path = replay_path
+		branch.checkpoint_interval = None
+		branch.profiler = TurnProfiler(teams) if self.profiler is not None else None
+		branch.budget = TurnBudget(self.options["turn_time_limit"], self.options["team_time_limit"]) if self.budget is not None else None
+		branch.rng = random.Random()
+		if seed is None:
+			branch.rng.setstate(self.rng.getstate())
+		else:
+			branch.rng.seed(seed)
+		branch.teams = []
+		for i, (name, team) in enumerate(zip(teams, self.teams)):
+			runner = branch.new_team(name, branch.rng.getrandbits(64) if seed is not None else 0)
+			runner.set_map(self.map)
+			state = None
+			if name == self.team_names[i]:
+				try:
+					state = team.get_state()
+				except TeamError:  # 队伍进程已经退出，重新创建玩家实例
+					pass
+			if state is not None:
+				if seed is not None:  # 使用新的种子，不恢复随机数状态
+					state["random"] = None
+			else:
+				state = {"random": None, "players": {rid: None for rid in self.available_entities_ids if self.entities[rid].info.team.tag == str(i)}}
+			runner.set_state(state)
+			branch.teams.append(runner)
+		restore_random()
+		return branch
 
 	# 结束比赛的方法
 	def end_game(self, reason: str, winner: Optional[int]) -> None:
 		# 保存胜者和胜利原因
 		self.replay["winner"] = self.team_names[winner] if winner is not None else "None"
 		self.replay["reason"] = reason
+		self.winner = winner
 
 		print("胜者：" + self.replay["winner"])
 		if reason == "eliminate":
@@ -287,24 +563,24 @@ class Instance:
 		team_energy_count = [[0, 0, 0, 0] for _ in self.team_names]
 		neutral_count = 0
 		for eid in self.available_entities_ids:
-			team_tag = self.entities[str(eid)].info.team.tag
+			team_tag = self.entities[eid].info.team.tag
 			if team_tag == "Neutral":
 				neutral_count += 1
 				continue
 			team_tag = int(team_tag)
-			entity_type = self.entities[str(eid)].info.type.name
+			entity_type = self.entities[eid].info.type.name
 			if entity_type == "planet":
 				team_entity_count[team_tag][0] += 1
-				team_energy_count[team_tag][0] += self.entities[str(eid)].info.energy
+				team_energy_count[team_tag][0] += self.entities[eid].info.energy
 			elif entity_type == "destroyer":
 				team_entity_count[team_tag][1] += 1
-				team_energy_count[team_tag][1] += self.entities[str(eid)].info.energy
+				team_energy_count[team_tag][1] += self.entities[eid].info.energy
 			elif entity_type == "miner":
 				team_entity_count[team_tag][2] += 1
-				team_energy_count[team_tag][2] += self.entities[str(eid)].info.energy
+				team_energy_count[team_tag][2] += self.entities[eid].info.energy
 			elif entity_type == "scout":
 				team_entity_count[team_tag][3] += 1
-				team_energy_count[team_tag][3] += self.entities[str(eid)].info.energy
+				team_energy_count[team_tag][3] += self.entities[eid].info.energy
 		
 
 		for t in range(len(self.team_names)):
@@ -329,5 +605,19 @@ class Instance:
 		print("========\n中立实体：{}".format(neutral_count))
 		print("回放已保存至：{}".format(self.replay_path))
 
+		if self.profiler is not None:
+			self.profiler.end_round()  # 在回合检查中结束的比赛，统计最后一个回合
 		self.save_replay()
+		if self.profiler is not None:
+			self.profiler.print_report()
+			if self.replay_path is not None:  # 不记录回放的分支也不保存耗时统计
+				print("耗时统计已保存至：{}".format(self.save_profile()))
+		if self.budget is not None:
+			self.budget.print_summary()
+		self.close_teams()
 		self.game_end_flag = True
+
+	# 结束所有队伍进程
+	def close_teams(self) -> None:
+		for team in self.teams:
+			team.close()
@@ -0,0 +1,99 @@
+import os
+import sys
+import json
+import mmap
+import struct
+from array import array
+from typing import List, Optional
+
+# 编译后的地图缓存，与地图json存放在同一目录下，文件名为<地图名>.cmap。
+# 文件结构：文件头 | 星球表（json） | 按x优先排列的以太密度（小端float64，8字节对齐）
+# 文件头中记录了源文件的大小与修改时间，源文件改变后缓存会被自动重建。
+CACHE_MAGIC = b"CSMP"
+CACHE_VERSION = 1
+_HEADER = struct.Struct("<4sHHIIqqI")  # 标识、版本、玩家数、宽、高、源文件大小、源文件修改时间、星球表长度
+
+
+def cache_path(map_path: str) -> str:
+	return os.path.splitext(map_path)[0] + ".cmap"
+
+
+# 将地图json中的格子列表转换为按x优先排列的数组
+def aether_array(aether_dense: List[dict], width: int, height: int) -> array:
+	aether = array("d", [float("nan")]) * (width * height)
+	for block in aether_dense:
+		x, y = block["x"], block["y"]
+		if 0 <= x < width and 0 <= y < height:
+			aether[x * height + y] = block["aether"]
+	if any(a != a for a in aether):  # nan表示缺失的格子
+		raise Exception("地图数据不完整。")
+	return aether
+
+
+def _source_stamp(map_path: str) -> tuple:
+	stat = os.stat(map_path)
+	return stat.st_size, stat.st_mtime_ns
+
+
+def write_cache(path: str, players: int, map_size: List[int], planets: List[dict], aether: array, stamp: tuple = (0, 0)) -> None:
+	planet_table = json.dumps(planets).encode("utf-8")
+	header = _HEADER.pack(CACHE_MAGIC, CACHE_VERSION, players, map_size[0], map_size[1], stamp[0], stamp[1], len(planet_table))
+	padding = b"\0" * (-(len(header) + len(planet_table)) % 8)
+	data = array("d", aether)
+	if sys.byteorder != "little":
+		data.byteswap()
+	tmp_path = "{}.{}.tmp".format(path, os.getpid())  # 并行的比赛可能同时重建同一个缓存，各自写入独立的临时文件
+	with open(tmp_path, "wb") as f:
+		f.write(header)
+		f.write(planet_table)
+		f.write(padding)
+		f.write(data.tobytes())
+	os.replace(tmp_path, path)  # 写入完成后再替换，避免留下不完整的缓存
+
+
+# 读取缓存。缓存不存在、版本不同或者与源文件不一致时返回None
+def read_cache(path: str, stamp: Optional[tuple] = None) -> Optional[dict]:
+	try:
+		f = open(path, "rb")
+	except OSError:
+		return None
+	with f:
+		if os.fstat(f.fileno()).st_size < _HEADER.size:
+			return None
+		with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+			magic, version, players, width, height, size, mtime, table_length = _HEADER.unpack_from(mm, 0)
+			if magic != CACHE_MAGIC or version != CACHE_VERSION:
+				return None
+			if stamp is not None and (size, mtime) != stamp:
+				return None
+			offset = _HEADER.size + table_length
+			offset += -offset % 8
+			if len(mm) != offset + 8 * width * height:
+				return None
+			planets = json.loads(mm[_HEADER.size:_HEADER.size + table_length].decode("utf-8"))
+			aether = array("d")
+			aether.frombytes(mm[offset:])
+	if sys.byteorder != "little":
+		aether.byteswap()
+	return {"players": players, "map_size": [width, height], "planets": planets, "aether": aether}
+
+
+# 读取地图。优先使用最新的缓存，否则解析json并尝试重建缓存
+def load_map(map_path: str, use_cache: bool = True) -> dict:
+	stamp = _source_stamp(map_path)
+	path = cache_path(map_path)
+	if use_cache:
+		fmap = read_cache(path, stamp)
+		if fmap is not None:
+			return fmap
+
+	with open(map_path, "r", encoding="utf-8") as f:
+		fmap = json.loads(f.read())  # 读取json格式的地图
+	width, height = fmap["map_size"]
+	result = {"players": fmap["players"], "map_size": [width, height], "planets": fmap["planets"], "aether": aether_array(fmap["map"], width, height)}
+	if use_cache:
+		try:
+			write_cache(path, result["players"], result["map_size"], result["planets"], result["aether"], stamp)
+		except OSError:  # 地图目录不可写时直接使用解析的结果
+			pass
+	return result
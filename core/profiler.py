@@ -0,0 +1,85 @@
+import time
+import heapq
+from typing import Callable, List
+
+from core.api import EntityInfo
+
+
+# 统计玩家代码耗时的工具。分别记录每个队伍、每种实体以及每个回合的墙上时间与CPU时间，其余时间计为引擎开销
+class TurnProfiler:
+	def __init__(self, team_names: List[str], slowest: int = 10) -> None:
+		self.team_names = team_names
+		self.teams = {}  # 队伍tag -> [墙上时间, CPU时间, 回合数]
+		self.types = {}  # (队伍tag, 实体种类) -> [墙上时间, CPU时间, 回合数]
+		self.rounds = []  # 每个回合各队伍的耗时与引擎开销
+		self.slowest = []  # 最慢的若干个实体回合，小根堆
+		self.slowest_count = slowest
+		self.engine = [0.0, 0.0]  # 引擎的墙上时间与CPU时间
+		self.round = 0
+		self.round_teams = {}
+		self.round_start = None  # 回合开始时的墙上时间与CPU时间，不在回合中时为None
+
+	def begin_round(self, round_count: int) -> None:
+		self.round = round_count
+		self.round_teams = {}
+		self.round_start = (time.perf_counter(), time.process_time())
+
+	# 结束当前回合的统计。比赛在回合检查中结束时会提前调用，重复调用没有效果
+	def end_round(self) -> None:
+		if self.round_start is None:
+			return
+		wall = time.perf_counter() - self.round_start[0]
+		cpu = time.process_time() - self.round_start[1]
+		bot_wall = sum(t[0] for t in self.round_teams.values())
+		bot_cpu = sum(t[1] for t in self.round_teams.values())
+		self.engine[0] += wall - bot_wall
+		self.engine[1] += cpu - bot_cpu
+		self.rounds.append({"round": self.round, "teams": {tag: t[0] for tag, t in self.round_teams.items()}, "engine": wall - bot_wall})
+		self.round_start = None
+
+	# 运行玩家实例并记录耗时
+	def run(self, run_player: Callable[[], object], info: EntityInfo) -> object:
+		team = info.team.tag
+		rtype = info.type.name
+		rid = info.ID
+		wall = time.perf_counter()
+		cpu = time.process_time()
+		try:
+			return run_player()
+		finally:
+			self.record(team, rtype, rid, time.perf_counter() - wall, time.process_time() - cpu)
+
+	def record(self, team: str, rtype: str, rid: int, wall: float, cpu: float) -> None:
+		for table, key in ((self.teams, team), (self.types, (team, rtype)), (self.round_teams, team)):
+			entry = table.get(key)
+			if entry is None:
+				entry = table[key] = [0.0, 0.0, 0]
+			entry[0] += wall
+			entry[1] += cpu
+			entry[2] += 1
+		item = (wall, self.round, rid, team, rtype)
+		if len(self.slowest) < self.slowest_count:
+			heapq.heappush(self.slowest, item)
+		elif wall > self.slowest[0][0]:
+			heapq.heapreplace(self.slowest, item)
+
+	def team_name(self, tag: str) -> str:
+		return self.team_names[int(tag)] if tag.isdigit() else tag
+
+	def report(self) -> dict:
+		return {
+			"engine": {"wall": self.engine[0], "cpu": self.engine[1]},
+			"teams": [{"team": tag, "name": self.team_name(tag), "wall": t[0], "cpu": t[1], "turns": t[2]} for tag, t in sorted(self.teams.items())],
+			"types": [{"team": tag, "type": rtype, "wall": t[0], "cpu": t[1], "turns": t[2]} for (tag, rtype), t in sorted(self.types.items())],
+			"slowest_turns": [{"wall": w, "round": r, "ID": rid, "team": tag, "type": rtype} for w, r, rid, tag, rtype in sorted(self.slowest, reverse=True)],
+			"rounds": self.rounds,
+		}
+
+	def print_report(self) -> None:
+		print("========\n玩家代码耗时（墙上时间 / CPU时间）：")
+		for tag, t in sorted(self.teams.items()):
+			print("[Team {}] {}: {:.3f}s / {:.3f}s，{} 次，平均 {:.3f}ms".format(tag, self.team_name(tag), t[0], t[1], t[2], 1000 * t[0] / t[2]))
+			for (team, rtype), s in sorted(self.types.items()):
+				if team == tag:
+					print("  {}: {:.3f}s / {:.3f}s，{} 次，平均 {:.3f}ms".format(rtype, s[0], s[1], s[2], 1000 * s[0] / s[2]))
+		print("引擎开销：{:.3f}s / {:.3f}s".format(self.engine[0], self.engine[1]))
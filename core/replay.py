@@ -0,0 +1,403 @@
+import os
+import json
+import zlib
+import struct
+from typing import Iterator, List, Optional, Tuple, Union
+
+
+# 流式写入回放文件。每一回合单独写成一行并立即写入磁盘，内存占用与回合数无关
+class ReplayWriter:
+	def __init__(self, path: str, game_map: dict) -> None:
+		self.path = path
+		self.rounds = 0  # 已经写入的回合数
+		directory = os.path.dirname(path)
+		if directory:
+			os.makedirs(directory, exist_ok=True)
+		self.file = open(path, "w", encoding="utf-8")
+		self.file.write('{"map": ' + json.dumps(game_map) + ', "rounds": [\n')
+		self.file.flush()
+
+	# 写入一个回合的所有实体
+	def write_round(self, entities: List[dict]) -> None:
+		if self.rounds != 0:
+			self.file.write(",\n" + json.dumps(entities))
+		else:
+			self.file.write(json.dumps(entities))
+		self.file.flush()
+		self.rounds += 1
+
+	# 当前的写入位置，用于从检查点继续写入
+	def checkpoint(self) -> dict:
+		self.file.flush()  # 检查点之前的内容必须已经写入磁盘
+		return {"position": self.file.tell(), "rounds": self.rounds}
+
+	# 从检查点继续写入已有的回放文件，检查点之后写入的内容会被丢弃
+	@classmethod
+	def resume(cls, path: str, checkpoint: dict) -> "ReplayWriter":
+		writer = cls.__new__(cls)
+		writer.path = path
+		writer.rounds = checkpoint["rounds"]
+		writer.file = open(path, "r+", encoding="utf-8")
+		writer.file.seek(checkpoint["position"])
+		writer.file.truncate()
+		return writer
+
+	# 写入比赛结果等其余字段并关闭文件，之后文件即为完整的json
+	def close(self, **fields: object) -> None:
+		self.file.write("\n]")
+		for key, value in fields.items():
+			self.file.write(", " + json.dumps(key) + ": " + json.dumps(value))
+		self.file.write("}\n")
+		self.file.close()
+
+
+# 读取回放文件。对于中途中断的比赛，返回截至最后一个完整回合的内容
+def load_replay(path: str) -> dict:
+	with open(path, "r", encoding="utf-8") as f:
+		content = f.read()
+	try:
+		return json.loads(content)
+	except json.JSONDecodeError:
+		pass
+
+	lines = content.split("\n")
+	header = lines[0]
+	if not header.endswith(', "rounds": ['):
+		raise Exception("无法识别的回放文件。")
+	replay = json.loads(header[:-len(', "rounds": [')] + "}")
+	replay["rounds"] = []
+	for line in lines[1:]:
+		line = line.rstrip(",")
+		round_entities = _try_loads(line)
+		if not isinstance(round_entities, list):  # 不完整的回合
+			break
+		replay["rounds"].append(round_entities)
+	return replay
+
+
+def _try_loads(text: str) -> Optional[object]:
+	try:
+		return json.loads(text)
+	except json.JSONDecodeError:
+		return None
+
+
+# 增量回放格式。每隔若干回合写入一个完整的关键帧，其余回合只记录相对上一回合的变化，文件末尾附带索引以便随机读取。
+# 文件结构：文件头 | 元数据块 | 回合块... | 结果块 | 索引块 | 索引位置
+# 每个块为 种类(1字节) + 长度(4字节) + zlib压缩的内容
+DELTA_MAGIC = b"CSRD"
+DELTA_INDEX_MAGIC = b"CSRI"
+DELTA_VERSION = 1
+BLOCK_META = b"M"
+BLOCK_KEYFRAME = b"K"
+BLOCK_DELTA = b"D"
+BLOCK_RESULT = b"R"
+BLOCK_INDEX = b"I"
+
+_HEADER = struct.Struct("<4sHH")  # 标识、版本、关键帧间隔
+_BLOCK = struct.Struct("<cI")
+_COUNT = struct.Struct("<I")
+_ID = struct.Struct("<I")
+_ENTITY = struct.Struct("<IqqiibBI")  # ID、能量、防护值、x、y、队伍、种类、广播值
+_CHANGE = struct.Struct("<IB")  # ID、变化的字段
+_TRAILER = struct.Struct("<Q4s")
+# 各字段在变化掩码中的位置与编码方式
+_FIELDS = [
+	(0x01, struct.Struct("<q")),  # 能量
+	(0x02, struct.Struct("<q")),  # 防护值
+	(0x04, struct.Struct("<ii")),  # 位置
+	(0x08, struct.Struct("<b")),  # 队伍
+	(0x10, struct.Struct("<B")),  # 种类
+	(0x20, struct.Struct("<I")),  # 广播值
+]
+ENTITY_TYPES = ["destroyer", "miner", "scout", "planet"]
+
+
+def _encode_team(tag: str) -> int:
+	return -1 if tag == "Neutral" else int(tag)
+
+
+def _decode_team(value: int) -> str:
+	return "Neutral" if value == -1 else str(value)
+
+
+# 将to_dict格式的实体转换为 ID -> 字段元组
+def _entity_row(entity: dict) -> Tuple[int, tuple]:
+	x, y = entity["location"]
+	return entity["ID"], (entity["energy"], entity["defence"], (x, y), _encode_team(entity["team"]), ENTITY_TYPES.index(entity["type"]), entity["radio"])
+
+
+def _entity_dict(rid: int, row: tuple) -> dict:
+	return {"ID": rid, "energy": row[0], "defence": row[1], "location": row[2], "team": _decode_team(row[3]), "type": ENTITY_TYPES[row[4]], "radio": row[5]}
+
+
+class DeltaReplayWriter:
+	def __init__(self, path: str, game_map: dict, keyframe_interval: int = 50) -> None:
+		if keyframe_interval <= 0:
+			raise Exception("关键帧间隔必须为正整数。")
+		self.path = path
+		self.keyframe_interval = keyframe_interval
+		self.rounds = 0  # 已经写入的回合数
+		self.offsets = []  # 每个回合块在文件中的位置
+		self.state = {}  # 上一回合的实体，ID -> 字段元组
+		directory = os.path.dirname(path)
+		if directory:
+			os.makedirs(directory, exist_ok=True)
+		self.file = open(path, "wb")
+		self.file.write(_HEADER.pack(DELTA_MAGIC, DELTA_VERSION, keyframe_interval))
+		self._write_block(BLOCK_META, json.dumps({"map": game_map}).encode("utf-8"))
+		self.file.flush()
+
+	def _write_block(self, kind: bytes, payload: bytes) -> None:
+		data = zlib.compress(payload)
+		self.file.write(_BLOCK.pack(kind, len(data)))
+		self.file.write(data)
+
+	def write_round(self, entities: List[dict]) -> None:
+		state = dict(_entity_row(e) for e in entities)
+		self.offsets.append(self.file.tell())
+		if self.rounds % self.keyframe_interval == 0:
+			self._write_block(BLOCK_KEYFRAME, self._encode_keyframe(state))
+		else:
+			self._write_block(BLOCK_DELTA, self._encode_delta(self.state, state))
+		self.file.flush()
+		self.state = state
+		self.rounds += 1
+
+	@staticmethod
+	def _encode_keyframe(state: dict) -> bytes:
+		parts = [_COUNT.pack(len(state))]
+		for rid, row in state.items():
+			parts.append(_ENTITY.pack(rid, row[0], row[1], row[2][0], row[2][1], row[3], row[4], row[5]))
+		return b"".join(parts)
+
+	@staticmethod
+	def _encode_delta(previous: dict, state: dict) -> bytes:
+		removed = [rid for rid in previous if rid not in state]
+		added = []
+		changed = []
+		for rid, row in state.items():
+			old = previous.get(rid)
+			if old is None:
+				added.append(_ENTITY.pack(rid, row[0], row[1], row[2][0], row[2][1], row[3], row[4], row[5]))
+			elif old != row:
+				mask = 0
+				fields = []
+				for i, (bit, fmt) in enumerate(_FIELDS):
+					if old[i] != row[i]:
+						mask |= bit
+						fields.append(fmt.pack(*row[i]) if i == 2 else fmt.pack(row[i]))
+				changed.append(_CHANGE.pack(rid, mask) + b"".join(fields))
+		parts = [_COUNT.pack(len(removed))]
+		parts.extend(_ID.pack(rid) for rid in removed)
+		parts.append(_COUNT.pack(len(added)))
+		parts.extend(added)
+		parts.append(_COUNT.pack(len(changed)))
+		parts.extend(changed)
+		return b"".join(parts)
+
+	# 当前的写入位置与编码状态，用于从检查点继续写入
+	def checkpoint(self) -> dict:
+		self.file.flush()
+		return {"position": self.file.tell(), "rounds": self.rounds, "offsets": list(self.offsets), "state": dict(self.state)}
+
+	# 从检查点继续写入已有的回放文件，检查点之后写入的内容会被丢弃
+	@classmethod
+	def resume(cls, path: str, checkpoint: dict) -> "DeltaReplayWriter":
+		writer = cls.__new__(cls)
+		writer.path = path
+		writer.file = open(path, "r+b")
+		magic, version, writer.keyframe_interval = _HEADER.unpack(writer.file.read(_HEADER.size))
+		if magic != DELTA_MAGIC or version != DELTA_VERSION:
+			raise Exception("无法识别的回放文件。")
+		writer.rounds = checkpoint["rounds"]
+		writer.offsets = list(checkpoint["offsets"])
+		writer.state = dict(checkpoint["state"])
+		writer.file.seek(checkpoint["position"])
+		writer.file.truncate()
+		return writer
+
+	# 索引的第一项为结果块的位置，其余为每个回合块的位置
+	def close(self, **fields: object) -> None:
+		result_offset = self.file.tell()
+		self._write_block(BLOCK_RESULT, json.dumps(fields).encode("utf-8"))
+		index_offset = self.file.tell()
+		self._write_block(BLOCK_INDEX, struct.pack("<{}Q".format(len(self.offsets) + 1), result_offset, *self.offsets))
+		self.file.write(_TRAILER.pack(index_offset, DELTA_INDEX_MAGIC))
+		self.file.close()
+
+
+# 读取增量回放。读取任意回合只需要解码最近的关键帧以及其后的增量
+class DeltaReplayReader:
+	def __init__(self, path: str) -> None:
+		self.path = path
+		self.file = open(path, "rb")
+		magic, version, self.keyframe_interval = _HEADER.unpack(self.file.read(_HEADER.size))
+		if magic != DELTA_MAGIC or version != DELTA_VERSION:
+			raise Exception("无法识别的回放文件。")
+		kind, payload = self._read_block(self.file.tell())
+		if kind != BLOCK_META:
+			raise Exception("无法识别的回放文件。")
+		meta = json.loads(payload)
+		self.map = meta["map"]
+		self.result = {}  # 比赛结果，中断的比赛没有此内容
+		self.offsets = self._load_index()
+
+	def __len__(self) -> int:
+		return len(self.offsets)
+
+	def __enter__(self) -> "DeltaReplayReader":
+		return self
+
+	def __exit__(self, *args: object) -> None:
+		self.close()
+
+	def close(self) -> None:
+		self.file.close()
+
+	def _read_block(self, offset: int) -> Tuple[Optional[bytes], bytes]:
+		self.file.seek(offset)
+		head = self.file.read(_BLOCK.size)
+		if len(head) < _BLOCK.size:
+			return None, b""
+		kind, length = _BLOCK.unpack(head)
+		data = self.file.read(length)
+		if len(data) < length:
+			return None, b""
+		try:
+			return kind, zlib.decompress(data)
+		except zlib.error:
+			return None, b""
+
+	# 优先使用文件末尾的索引，不完整的文件则逐块扫描
+	def _load_index(self) -> List[int]:
+		size = os.fstat(self.file.fileno()).st_size
+		if size >= _TRAILER.size:
+			self.file.seek(size - _TRAILER.size)
+			index_offset, magic = _TRAILER.unpack(self.file.read(_TRAILER.size))
+			if magic == DELTA_INDEX_MAGIC:
+				kind, payload = self._read_block(index_offset)
+				if kind == BLOCK_INDEX:
+					offsets = list(struct.unpack("<{}Q".format(len(payload) // 8), payload))
+					kind, payload = self._read_block(offsets[0])
+					if kind == BLOCK_RESULT:
+						self.result = json.loads(payload)
+					return offsets[1:]
+
+		offsets = []
+		self.file.seek(_HEADER.size)
+		offset = self.file.tell()
+		while True:
+			self.file.seek(offset)
+			head = self.file.read(_BLOCK.size)
+			if len(head) < _BLOCK.size:
+				break
+			kind, length = _BLOCK.unpack(head)
+			if kind in (BLOCK_KEYFRAME, BLOCK_DELTA):
+				if self._read_block(offset)[0] is None:  # 不完整的回合
+					break
+				offsets.append(offset)
+			elif kind == BLOCK_RESULT:
+				payload = self._read_block(offset)[1]
+				if payload:
+					self.result = json.loads(payload)
+				break
+			offset += _BLOCK.size + length
+		return offsets
+
+	def is_keyframe(self, n: int) -> bool:
+		return n % self.keyframe_interval == 0
+
+	# 获得第n个回合的状态，ID -> 字段元组
+	def _state_at(self, n: int) -> dict:
+		if not 0 <= n < len(self.offsets):
+			raise IndexError("回合不存在。")
+		start = n - n % self.keyframe_interval
+		state = {}
+		for i in range(start, n + 1):
+			kind, payload = self._read_block(self.offsets[i])
+			if kind == BLOCK_KEYFRAME:
+				state = self._decode_keyframe(payload)
+			else:
+				self._apply_delta(state, payload)
+		return state
+
+	@staticmethod
+	def _decode_keyframe(payload: bytes) -> dict:
+		state = {}
+		count = _COUNT.unpack_from(payload, 0)[0]
+		for rid, energy, defence, x, y, team, rtype, radio in _ENTITY.iter_unpack(payload[_COUNT.size:_COUNT.size + count * _ENTITY.size]):
+			state[rid] = (energy, defence, (x, y), team, rtype, radio)
+		return state
+
+	@staticmethod
+	def _apply_delta(state: dict, payload: bytes) -> None:
+		pos = 0
+		count = _COUNT.unpack_from(payload, pos)[0]
+		pos += _COUNT.size
+		for _ in range(count):
+			del state[_ID.unpack_from(payload, pos)[0]]
+			pos += _ID.size
+		count = _COUNT.unpack_from(payload, pos)[0]
+		pos += _COUNT.size
+		for _ in range(count):
+			rid, energy, defence, x, y, team, rtype, radio = _ENTITY.unpack_from(payload, pos)
+			state[rid] = (energy, defence, (x, y), team, rtype, radio)
+			pos += _ENTITY.size
+		count = _COUNT.unpack_from(payload, pos)[0]
+		pos += _COUNT.size
+		for _ in range(count):
+			rid, mask = _CHANGE.unpack_from(payload, pos)
+			pos += _CHANGE.size
+			row = list(state[rid])
+			for i, (bit, fmt) in enumerate(_FIELDS):
+				if mask & bit:
+					value = fmt.unpack_from(payload, pos)
+					row[i] = value if i == 2 else value[0]
+					pos += fmt.size
+			state[rid] = tuple(row)
+
+	# 获得第n个回合的所有实体，格式与to_dict相同。回合内实体的顺序不做保证
+	def get_round(self, n: int) -> List[dict]:
+		return [_entity_dict(rid, row) for rid, row in self._state_at(n).items()]
+
+	def iter_rounds(self) -> Iterator[List[dict]]:
+		state = {}
+		for i, offset in enumerate(self.offsets):
+			kind, payload = self._read_block(offset)
+			if kind == BLOCK_KEYFRAME:
+				state = self._decode_keyframe(payload)
+			else:
+				self._apply_delta(state, payload)
+			yield [_entity_dict(rid, row) for rid, row in state.items()]
+
+	# 转换为与json回放相同的结构
+	def to_dict(self) -> dict:
+		replay = {"map": self.map, "rounds": list(self.iter_rounds())}
+		replay.update(self.result)
+		return replay
+
+
+REPLAY_FORMATS = {"json": ReplayWriter, "delta": DeltaReplayWriter}
+REPLAY_EXTENSIONS = {"json": "rpl", "delta": "rpd"}
+
+
+def open_replay_writer(replay_format: str, path: str, game_map: dict) -> Union[ReplayWriter, DeltaReplayWriter]:
+	if replay_format not in REPLAY_FORMATS:
+		raise Exception("无效的回放格式。")
+	return REPLAY_FORMATS[replay_format](path, game_map)
+
+
+def resume_replay_writer(replay_format: str, path: str, checkpoint: dict) -> Union[ReplayWriter, DeltaReplayWriter]:
+	if replay_format not in REPLAY_FORMATS:
+		raise Exception("无效的回放格式。")
+	return REPLAY_FORMATS[replay_format].resume(path, checkpoint)
+
+
+# 将json回放转换为增量回放
+def convert_replay(source: str, target: str, keyframe_interval: int = 50) -> None:
+	replay = load_replay(source)
+	writer = DeltaReplayWriter(target, replay["map"], keyframe_interval)
+	for round_entities in replay["rounds"]:
+		writer.write_round(round_entities)
+	writer.close(**{k: v for k, v in replay.items() if k not in ("map", "rounds")})
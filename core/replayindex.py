@@ -0,0 +1,244 @@
+import os
+import re
+import sys
+import json
+import mmap
+import bisect
+import struct
+from array import array
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# json回放（.rpl）的查询。回放文件被映射到内存，每个回合单独占一行，每个实体以{"ID": 开头，
+# 因此只需扫描一次文件就能建立按回合与按实体ID的索引，之后的查询只解码需要的回合或者实体。
+# 索引保存在回放旁的<回放文件>.idx中，文件头记录了回放的大小与修改时间，回放改变后索引会被重建。
+# 索引文件结构：文件头 | 回合位置 | 实体ID | 各实体记录的起点 | 记录的回合 | 记录的位置（均为小端）
+INDEX_MAGIC = b"CSRX"
+INDEX_VERSION = 1
+_HEADER = struct.Struct("<4sHqqII")  # 标识、版本、回放大小、回放修改时间、回合数、实体数
+_ENTITY_START = re.compile(rb'\{"ID": (\d+)')
+_ROUNDS_HEADER = b', "rounds": ['
+
+
+def index_path(replay_path: str) -> str:
+	return replay_path + ".idx"
+
+
+def _stamp(path: str) -> tuple:
+	stat = os.stat(path)
+	return stat.st_size, stat.st_mtime_ns
+
+
+def _little(data: array) -> array:
+	if sys.byteorder != "little":
+		data = array(data.typecode, data)
+		data.byteswap()
+	return data
+
+
+class ReplayIndex:
+	def __init__(self, path: str, use_cache: bool = True) -> None:
+		self.path = path
+		self.file = open(path, "rb")
+		try:
+			self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+		except ValueError:  # 空文件
+			self.file.close()
+			raise Exception("无法识别的回放文件。")
+		header_end = self.data.find(b"\n")
+		rounds_start = header_end - 1 if header_end > 0 and self.data[header_end - 1] == ord("\r") else header_end  # Windows下的换行符
+		if header_end == -1 or self.data[rounds_start - len(_ROUNDS_HEADER):rounds_start] != _ROUNDS_HEADER:
+			self.close()
+			raise Exception("无法识别的回放文件。")
+		self.header_end = header_end
+		self.map_end = rounds_start - len(_ROUNDS_HEADER)  # 文件头中地图部分的终点
+		self._map = None
+		self.result = {}  # 比赛结果，中断的比赛没有此内容
+		self.round_offsets = array("q")  # 每个回合所在行的起点，最后一项为回合部分的终点
+		self.ids = array("q")  # 按大小排列的实体ID
+		self.starts = array("q")  # 每个实体的记录在postings中的起点
+		self.posting_rounds = array("i")  # 按实体排列，实体出现的回合
+		self.posting_offsets = array("q")  # 对应回合中该实体在文件中的位置
+		if use_cache and self._load_index():
+			self._read_result()
+		else:
+			self._build_index()
+			self._read_result()
+			if use_cache and self.result:  # 比赛尚未结束时回放还会变化，不保存索引
+				self._save_index()
+
+	def __len__(self) -> int:
+		return len(self.round_offsets) - 1
+
+	def __enter__(self) -> "ReplayIndex":
+		return self
+
+	def __exit__(self, *args: object) -> None:
+		self.close()
+
+	def close(self) -> None:
+		self.data.close()
+		self.file.close()
+
+	@property
+	def map(self) -> dict:
+		if self._map is None:
+			self._map = json.loads(self.data[:self.map_end] + b"}")["map"]
+		return self._map
+
+	# 扫描整个回放，记录每个回合与每个实体的位置
+	def _build_index(self) -> None:
+		data = self.data
+		postings = {}  # 实体ID -> (回合, 位置)
+		pos = self.header_end + 1
+		n = 0
+		while pos < len(data) and data[pos:pos + 1] == b"[":
+			end = data.find(b"\n", pos)
+			line_end = len(data) if end == -1 else end
+			content_end = line_end
+			while data[content_end - 1:content_end] in (b",", b"\r"):  # 行尾的逗号，以及Windows下的换行符
+				content_end -= 1
+			if data[content_end - 2:content_end] != b"}]" and data[pos:content_end] != b"[]":  # 不完整的回合
+				break
+			self.round_offsets.append(pos)
+			for match in _ENTITY_START.finditer(data, pos, content_end):
+				entry = postings.get(int(match.group(1)))
+				if entry is None:
+					entry = postings[int(match.group(1))] = (array("i"), array("q"))
+				entry[0].append(n)
+				entry[1].append(match.start())
+			n += 1
+			if end == -1:
+				pos = len(data)
+				break
+			pos = end + 1
+		self.round_offsets.append(pos)
+		self.starts.append(0)
+		for rid in sorted(postings):
+			rounds, offsets = postings[rid]
+			self.ids.append(rid)
+			self.posting_rounds.extend(rounds)
+			self.posting_offsets.extend(offsets)
+			self.starts.append(len(self.posting_rounds))
+
+	def _read_result(self) -> None:
+		pos = self.round_offsets[-1]
+		tail = self.data[pos:].strip()
+		if tail.startswith(b"]") and tail.endswith(b"}"):
+			rest = tail[1:].strip()
+			self.result = json.loads(b"{" + rest[1:]) if rest.startswith(b",") else {}
+
+	def _save_index(self) -> None:
+		size, mtime = _stamp(self.path)
+		tmp_path = "{}.{}.tmp".format(index_path(self.path), os.getpid())  # 多个进程可能同时为同一个回放建立索引
+		with open(tmp_path, "wb") as f:
+			f.write(_HEADER.pack(INDEX_MAGIC, INDEX_VERSION, size, mtime, len(self), len(self.ids)))
+			for column in (self.round_offsets, self.ids, self.starts, self.posting_offsets, self.posting_rounds):
+				f.write(_little(column).tobytes())
+		os.replace(tmp_path, index_path(self.path))
+
+	# 读取保存的索引。索引不存在或者与回放不一致时返回False
+	def _load_index(self) -> bool:
+		try:
+			with open(index_path(self.path), "rb") as f:
+				content = f.read()
+		except OSError:
+			return False
+		if len(content) < _HEADER.size:
+			return False
+		magic, version, size, mtime, rounds, entities = _HEADER.unpack_from(content)
+		if magic != INDEX_MAGIC or version != INDEX_VERSION or (size, mtime) != _stamp(self.path):
+			return False
+		pos = _HEADER.size
+		columns = []
+		for typecode, count in (("q", rounds + 1), ("q", entities), ("q", entities + 1), ("q", None), ("i", None)):
+			if count is None:  # 记录的总数
+				count = columns[2][-1] if columns[2] else 0
+			column = array(typecode)
+			column.frombytes(content[pos:pos + count * column.itemsize])
+			if sys.byteorder != "little":
+				column.byteswap()
+			pos += count * column.itemsize
+			columns.append(column)
+		if pos != len(content):
+			return False
+		self.round_offsets, self.ids, self.starts, self.posting_offsets, self.posting_rounds = columns
+		return True
+
+	def _entity_at(self, offset: int) -> dict:
+		end = self.data.find(b"}", offset)  # 实体中没有嵌套的对象
+		return json.loads(self.data[offset:end + 1])
+
+	# 获得第n个回合的所有实体，格式与to_dict相同
+	def get_round(self, n: int) -> List[dict]:
+		if not 0 <= n < len(self):
+			raise IndexError("回合不存在。")
+		start = self.round_offsets[n]
+		end = self.data.find(b"\n", start, self.round_offsets[n + 1])
+		line = self.data[start:end if end != -1 else self.round_offsets[n + 1]].rstrip(b",\r")
+		return json.loads(line)
+
+	def entity_ids(self) -> array:
+		return self.ids
+
+	def _postings(self, rid: int) -> Tuple[int, int]:
+		i = bisect.bisect_left(self.ids, rid)
+		if i == len(self.ids) or self.ids[i] != rid:
+			return 0, 0
+		return self.starts[i], self.starts[i + 1]
+
+	# 实体出现过的所有回合
+	def rounds_of(self, rid: int) -> array:
+		start, end = self._postings(rid)
+		return self.posting_rounds[start:end]
+
+	# 实体在每个回合的状态，每一项为(回合, 实体)。只解码该实体所在的片段
+	def timeline(self, rid: int, first: int = 0, last: Optional[int] = None) -> List[Tuple[int, dict]]:
+		start, end = self._postings(rid)
+		rounds = self.posting_rounds
+		lo = bisect.bisect_left(rounds, first, start, end)
+		hi = end if last is None else bisect.bisect_right(rounds, last, lo, end)
+		return [(rounds[i], self._entity_at(self.posting_offsets[i])) for i in range(lo, hi)]
+
+	# 实体某个字段随回合的变化，例如field_timeline(rid, "energy")
+	def field_timeline(self, rid: int, field: str, first: int = 0, last: Optional[int] = None) -> List[Tuple[int, object]]:
+		return [(n, entity[field]) for n, entity in self.timeline(rid, first, last)]
+
+	# 第n个回合中位于矩形[x0, x1] x [y0, y1]内的实体，可以按队伍与种类筛选
+	def entities_in_box(self, n: int, x0: int, y0: int, x1: int, y1: int, teams: Optional[Iterable[str]] = None, types: Optional[Iterable[str]] = None) -> List[dict]:
+		teams = None if teams is None else set(teams)
+		types = None if types is None else set(types)
+		result = []
+		for entity in self.get_round(n):
+			x, y = entity["location"]
+			if x0 <= x <= x1 and y0 <= y <= y1 and (teams is None or entity["team"] in teams) and (types is None or entity["type"] in types):
+				result.append(entity)
+		return result
+
+	# 第n个回合中各队伍实体的外接矩形(x0, y0, x1, y1)，可以用来观察战线
+	def team_bounds(self, n: int, types: Optional[Iterable[str]] = None) -> Dict[str, Tuple[int, int, int, int]]:
+		types = None if types is None else set(types)
+		bounds = {}
+		for entity in self.get_round(n):
+			if types is not None and entity["type"] not in types:
+				continue
+			x, y = entity["location"]
+			box = bounds.get(entity["team"])
+			bounds[entity["team"]] = (x, y, x, y) if box is None else (min(box[0], x), min(box[1], y), max(box[2], x), max(box[3], y))
+		return bounds
+
+	# 第n个回合各队伍的汇总：实体数、总能量、总防护值以及各种类的实体数
+	def team_summary(self, n: int) -> Dict[str, dict]:
+		summary = {}
+		for entity in self.get_round(n):
+			team = summary.get(entity["team"])
+			if team is None:
+				team = summary[entity["team"]] = {"count": 0, "energy": 0, "defence": 0, "types": {}}
+			team["count"] += 1
+			team["energy"] += entity["energy"]
+			team["defence"] += entity["defence"]
+			team["types"][entity["type"]] = team["types"].get(entity["type"], 0) + 1
+		return summary
+
+	# 各队伍的汇总随回合的变化，rounds为需要的回合，默认为所有回合
+	def team_series(self, rounds: Optional[Iterable[int]] = None) -> List[Tuple[int, Dict[str, dict]]]:
+		return [(n, self.team_summary(n)) for n in (range(len(self)) if rounds is None else rounds)]
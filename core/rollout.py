@@ -0,0 +1,49 @@
+import io
+import pickle
+import contextlib
+import multiprocessing
+from typing import List, Optional
+
+# 从同一局面出发运行多个分支，例如用不同的种子或者队伍代码衡量局面的优劣。
+# 每个进程只重建一次局面，之后的分支都通过Instance.fork从它复制
+_base = None
+
+
+def _init_worker(state: bytes) -> None:
+	global _base
+	from core.game import Instance
+
+	state = pickle.loads(state)
+	with contextlib.redirect_stdout(io.StringIO()):
+		_base = Instance(**dict(state["options"], show_progress=False, team_workers=False, checkpoint_interval=None))
+		_base.restore_checkpoint(state)
+
+
+def _run_branch(task: tuple) -> dict:
+	seed, teams, rounds = task
+	with contextlib.redirect_stdout(io.StringIO()):
+		branch = _base.fork(seed, teams)
+		if rounds is not None:
+			branch.game_round = min(branch.round + rounds, branch.game_round)
+		_, reason, _ = branch.run()
+	return {"seed": seed, "winner": branch.winner, "reason": reason, "played_rounds": branch.round, "charge_result": branch.charge_result}
+
+
+# 从game的当前回合运行每个种子对应的分支，返回各分支的结果。rounds为分支最多继续的回合数，
+# processes为0时在当前进程中运行，否则在进程池中并行运行
+def run_rollouts(game, seeds: List[int], teams: Optional[List[str]] = None, rounds: Optional[int] = None, processes: Optional[int] = None) -> List[dict]:
+	global _base
+	tasks = [(seed, teams, rounds) for seed in seeds]
+	if processes == 0:
+		_base = game
+		try:
+			return [_run_branch(task) for task in tasks]
+		finally:
+			_base = None
+	state = game.checkpoint_state()
+	state["replay_path"] = None  # 分支不记录回放
+	state["replay_writer"] = None
+	data = pickle.dumps(state, pickle.HIGHEST_PROTOCOL)
+	ctx = multiprocessing.get_context("spawn")
+	with ctx.Pool(processes, _init_worker, (data,)) as pool:
+		return pool.map(_run_branch, tasks)
@@ -0,0 +1,204 @@
+import io
+import os
+import sys
+import json
+import math
+import time
+import random
+import itertools
+import traceback
+import contextlib
+import multiprocessing
+from multiprocessing.connection import Connection, wait
+from typing import List, Optional
+
+
+# 一场比赛的描述
+class Match:
+	def __init__(self, match_id: int, roster_ids: List[int], teams: List[str], map_name: str, seed: int, rounds: int) -> None:
+		self.match_id = match_id
+		self.roster_ids = roster_ids  # 每个座位对应的参赛者序号
+		self.teams = teams  # 每个座位对应的队伍代码
+		self.map_name = map_name
+		self.seed = seed
+		self.rounds = rounds
+
+	def to_dict(self) -> dict:
+		return {"id": self.match_id, "roster": self.roster_ids, "teams": self.teams, "map": self.map_name, "seed": self.seed, "rounds": self.rounds}
+
+
+# 在子进程中运行一场比赛，并通过管道返回结果
+def run_match(match: dict, map_dir: str, replay_dir: str, conn: Connection) -> None:
+	result = {"status": "error"}
+	start = time.time()
+	try:
+		from core.game import Instance
+
+		random.seed(match["seed"])
+		with contextlib.redirect_stdout(io.StringIO()):
+			game = Instance(list(match["teams"]), os.path.join(map_dir, "{}.json".format(match["map"])), match["rounds"], False, False)
+			game.replay_path = os.path.join(replay_dir, "match-{}.rpl".format(match["id"]))
+			_, reason, replay_path = game.run()
+		result = {"status": "ok", "winner": game.winner, "reason": reason, "replay": replay_path, "played_rounds": game.round}
+	except Exception:
+		result = {"status": "error", "error": traceback.format_exc()}
+	finally:
+		result["time"] = time.time() - start
+		conn.send(result)
+		conn.close()
+
+
+# 锦标赛。根据赛制生成比赛，在进程池中并行运行，并汇总结果
+class Tournament:
+	FORMATS = ["round_robin", "swiss", "gauntlet"]
+
+	def __init__(self, roster: List[str], maps: List[str], seeds: List[int], tournament_format: str = "round_robin", rounds: int = 1000,
+				processes: Optional[int] = None, timeout: float = 600, challenger: Optional[str] = None, swiss_rounds: Optional[int] = None,
+				map_dir: str = "./maps", replay_dir: Optional[str] = None) -> None:
+		if tournament_format not in self.FORMATS:
+			raise Exception("无效的赛制。")
+		if tournament_format == "gauntlet" and challenger not in roster:
+			raise Exception("挑战者必须在参赛名单中。")
+		self.roster = roster
+		self.maps = maps
+		self.seeds = seeds
+		self.format = tournament_format
+		self.rounds = rounds
+		self.processes = processes or os.cpu_count() or 1
+		self.timeout = timeout  # 每场比赛的时间上限（秒）
+		self.challenger = challenger
+		self.swiss_rounds = swiss_rounds or max(1, math.ceil(math.log2(len(roster))))
+		self.map_dir = map_dir
+		self.replay_dir = replay_dir or "./replays/tournament-{}".format(int(time.time()))
+		self.map_players = {m: self._map_players(m) for m in maps}
+		self.matches = []  # 所有已经生成的比赛
+		self.match_count = 0
+		self.results = {}  # 比赛ID -> 结果
+		self.points = [0.0] * len(roster)
+		self.byes = []  # 瑞士制中轮空的记录
+
+	def _map_players(self, map_name: str) -> int:
+		with open(os.path.join(self.map_dir, "{}.json".format(map_name)), "r", encoding="utf-8") as f:
+			return json.loads(f.read())["players"]
+
+	# 为一组参赛者在所有地图和种子上生成比赛，座位顺序由种子决定
+	def _schedule(self, group: tuple) -> List[Match]:
+		matches = []
+		for map_name in self.maps:
+			if self.map_players[map_name] != len(group):
+				continue
+			for seed in self.seeds:
+				seats = list(group)
+				random.Random(seed).shuffle(seats)
+				matches.append(Match(self.match_count, seats, [self.roster[i] for i in seats], map_name, seed, self.rounds))
+				self.match_count += 1
+		return matches
+
+	def _groups(self, size: int) -> List[tuple]:
+		ids = range(len(self.roster))
+		if self.format == "gauntlet":
+			challenger = self.roster.index(self.challenger)
+			others = [i for i in ids if i != challenger]
+			return [(challenger,) + g for g in itertools.combinations(others, size - 1)]
+		return list(itertools.combinations(ids, size))
+
+	# 瑞士制：按当前积分排序，相邻且未交手过的参赛者配对
+	def _swiss_pairs(self, played: set, swiss_round: int) -> List[tuple]:
+		order = sorted(range(len(self.roster)), key=lambda i: -self.points[i])
+		pairs = []
+		while len(order) > 1:
+			a = order.pop(0)
+			partner = next((b for b in order if (min(a, b), max(a, b)) not in played), order[0])
+			order.remove(partner)
+			pairs.append((a, partner))
+		if order:  # 轮空的参赛者视为赢下一次配对的所有比赛
+			points = len(self.maps) * len(self.seeds)
+			self.points[order[0]] += points
+			self.byes.append({"round": swiss_round, "team": self.roster[order[0]], "roster_id": order[0], "points": points})
+		return pairs
+
+	def run(self) -> dict:
+		os.makedirs(self.replay_dir, exist_ok=True)
+		if self.format == "swiss":
+			if any(p != 2 for p in self.map_players.values()):
+				raise Exception("瑞士制只支持双人地图。")
+			played = set()
+			for swiss_round in range(self.swiss_rounds):
+				batch = []
+				for pair in self._swiss_pairs(played, swiss_round):
+					played.add((min(pair), max(pair)))
+					batch.extend(self._schedule(pair))
+				self._run_batch(batch)
+		else:
+			batch = []
+			for size in sorted(set(self.map_players.values())):
+				for group in self._groups(size):
+					batch.extend(self._schedule(group))
+			self._run_batch(batch)
+		return self.summary()
+
+	# 在进程池中运行一批比赛。每场比赛在独立的进程中运行，超时或者崩溃不会影响其他比赛
+	def _run_batch(self, matches: List[Match]) -> None:
+		self.matches.extend(matches)
+		ctx = multiprocessing.get_context("spawn")
+		pending = list(matches)
+		running = {}  # 接收结果的管道 -> (比赛, 进程, 开始时间)
+		while pending or running:
+			while pending and len(running) < self.processes:
+				match = pending.pop(0)
+				receiver, sender = ctx.Pipe(duplex=False)
+				process = ctx.Process(target=run_match, args=(match.to_dict(), self.map_dir, self.replay_dir, sender), daemon=True)
+				process.start()
+				sender.close()
+				running[receiver] = (match, process, time.time())
+
+			now = time.time()
+			deadline = min(start + self.timeout for _, _, start in running.values())
+			# 等待管道而不是进程：结果超过管道缓冲区时，子进程要等结果被读取后才能退出
+			for receiver in wait(list(running), timeout=max(0.0, deadline - now)):
+				match, process, start = running.pop(receiver)
+				try:
+					result = receiver.recv()
+				except EOFError:  # 进程在返回结果之前退出
+					process.join()
+					result = {"status": "crash", "exitcode": process.exitcode, "time": time.time() - start}
+				receiver.close()
+				process.join()
+				self._record(match, result)
+
+			now = time.time()
+			for receiver, (match, process, start) in list(running.items()):
+				if now - start >= self.timeout:
+					process.kill()
+					process.join()
+					receiver.close()
+					del running[receiver]
+					self._record(match, {"status": "timeout", "time": now - start})
+
+	def _record(self, match: Match, result: dict) -> None:
+		self.results[match.match_id] = result
+		if result["status"] != "ok":
+			print("[Match {}] {}".format(match.match_id, result["status"]), file=sys.stderr)
+			return
+		if result["winner"] is None:
+			for rid in match.roster_ids:
+				self.points[rid] += 1 / len(match.roster_ids)
+		else:
+			self.points[match.roster_ids[result["winner"]]] += 1
+
+	def summary(self) -> dict:
+		standings = sorted(range(len(self.roster)), key=lambda i: -self.points[i])
+		matches = []
+		for match in self.matches:
+			entry = match.to_dict()
+			entry.update(self.results.get(match.match_id, {"status": "skipped"}))
+			matches.append(entry)
+		return {
+			"format": self.format,
+			"roster": self.roster,
+			"maps": self.maps,
+			"seeds": self.seeds,
+			"standings": [{"team": self.roster[i], "roster_id": i, "points": self.points[i]} for i in standings],
+			"matches": matches,
+			"byes": self.byes,
+		}
@@ -0,0 +1,251 @@
+import io
+import pickle
+import random
+import importlib
+import multiprocessing
+from multiprocessing.connection import Connection
+from typing import List, Optional, Tuple
+
+from core.api import EntityInfo
+from core.budget import player_code
+from core.entity import Controller
+from core.classes import Map
+
+try:
+	import resource
+except ImportError:  # Windows下无法限制子进程的内存
+	resource = None
+
+# 队伍代码通过random模块获得随机数。运行某个队伍的代码之前，将这些函数绑定到该队伍独立的随机数生成器上，
+# 这样各个队伍的随机序列互不影响，也与引擎自身的随机数无关，在独立进程中运行时可以得到完全相同的结果。
+# 注意：使用from random import ...导入的函数不受影响。
+RANDOM_FUNCTIONS = [name for name in random.__all__ if callable(getattr(random.Random, name, None)) and not isinstance(getattr(random.Random, name), type)]
+_DEFAULT_RANDOM = {name: getattr(random, name) for name in RANDOM_FUNCTIONS}
+_bound_random = None
+
+
+def use_team_random(rng: random.Random) -> None:
+	global _bound_random
+	if _bound_random is rng:
+		return
+	for name in RANDOM_FUNCTIONS:
+		setattr(random, name, getattr(rng, name))
+	_bound_random = rng
+
+
+# 恢复random模块的默认函数
+def restore_random() -> None:
+	global _bound_random
+	if _bound_random is None:
+		return
+	for name, func in _DEFAULT_RANDOM.items():
+		setattr(random, name, func)
+	_bound_random = None
+
+
+# 队伍进程中的玩家代码抛出了错误。info为玩家代码修改后的实体信息
+class TeamError(Exception):
+	def __init__(self, message: str, info: Optional[EntityInfo] = None) -> None:
+		super().__init__(message)
+		self.info = info
+
+
+# 序列化玩家实例时，地图替换为引用
+class _PlayerPickler(pickle.Pickler):
+	def __init__(self, file: io.BytesIO, gmap: Optional[Map]) -> None:
+		super().__init__(file, pickle.HIGHEST_PROTOCOL)
+		self.gmap = gmap
+
+	def persistent_id(self, obj: object) -> Optional[str]:
+		return "map" if obj is self.gmap and obj is not None else None
+
+
+class _PlayerUnpickler(pickle.Unpickler):
+	def __init__(self, file: io.BytesIO, gmap: Optional[Map]) -> None:
+		super().__init__(file)
+		self.gmap = gmap
+
+	def persistent_load(self, pid: str) -> Optional[Map]:
+		return self.gmap
+
+
+# 在引擎进程中运行的队伍
+class LocalTeam:
+	def __init__(self, name: str, seed: int) -> None:
+		self.name = name
+		self.module = importlib.import_module(f"src.{name}.main")  # 导入玩家的代码
+		self.rng = random.Random(seed)
+		self.players = {}  # 实体ID -> 玩家实例
+		self.gmap = None
+
+	def set_map(self, gmap: Map) -> None:
+		self.gmap = gmap
+
+	def spawn(self, rid: int) -> None:
+		use_team_random(self.rng)
+		self.players[rid] = self.module.Player()  # 对应队伍的实例
+
+	def drop(self, rid: int) -> None:
+		del self.players[rid]
+
+	def run(self, rid: int, controller: Controller) -> Tuple[EntityInfo, float, List[list]]:
+		use_team_random(self.rng)
+		with player_code():
+			controller = self.players[rid].run(controller)  # 运行玩家实例
+		return controller.get_actions()
+
+	# 队伍的随机数状态与序列化后的玩家实例，无法序列化的玩家实例记为None
+	def get_state(self) -> dict:
+		players = {}
+		for rid, player in self.players.items():
+			buffer = io.BytesIO()
+			try:
+				_PlayerPickler(buffer, self.gmap).dump(player)
+				players[rid] = buffer.getvalue()
+			except Exception:
+				players[rid] = None
+		return {"random": self.rng.getstate(), "players": players}
+
+	# 恢复get_state保存的状态。无法序列化的玩家实例会重新创建
+	def set_state(self, state: dict) -> None:
+		self.players = {}
+		for rid, data in state["players"].items():
+			if data is None:
+				self.spawn(rid)
+			else:
+				self.players[rid] = _PlayerUnpickler(io.BytesIO(data), self.gmap).load()
+		if state["random"] is not None:
+			self.rng.setstate(state["random"])
+
+	def flush(self) -> None:
+		pass
+
+	def close(self) -> None:
+		pass
+
+
+# 队伍进程的主循环。每条消息为(序号, 批量的操作, 请求)，请求为("run", 实体ID, 控制器)、("state",)、("stop",)或None，
+# 对请求的回复为(序号, 状态, 结果)
+def team_worker_main(conn: Connection, name: str, seed: int, memory_limit: Optional[int]) -> None:
+	if memory_limit is not None and resource is not None:
+		resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+	team = LocalTeam(name, seed)
+	while True:
+		try:
+			data = conn.recv_bytes()
+		except EOFError:
+			break
+		seq, ops, request = pickle.loads(data)
+		for op, target in ops:
+			if op == "spawn":
+				team.spawn(target)
+			elif op == "drop":
+				team.drop(target)
+			elif op == "map":
+				team.set_map(target)
+			elif op == "restore":
+				team.set_state(target)
+		if request is None:
+			continue
+		if request[0] == "stop":
+			break
+		if request[0] == "state":
+			reply = (seq, "ok", team.get_state())
+		else:
+			_, rid, controller = request
+			setattr(controller, "_Controller__map", team.gmap)
+			try:
+				reply = (seq, "ok", team.run(rid, controller))
+			except Exception as err:
+				reply = (seq, "error", (str(err), getattr(controller, "_Controller__info")))
+		conn.send_bytes(pickle.dumps(reply, pickle.HIGHEST_PROTOCOL))
+	conn.close()
+
+
+# 在独立进程中运行的队伍。实体的增删等操作会被缓存起来，与下一次请求或者回合结束时一起发送
+class TeamWorker:
+	def __init__(self, name: str, seed: int, memory_limit: Optional[int] = None, timeout: Optional[float] = None) -> None:
+		self.name = name
+		self.timeout = timeout  # 等待一个请求的最长时间，超时后认为进程已经失去响应
+		self.pending = []  # 尚未发送的操作
+		self.seq = 0
+		self.alive = True
+		ctx = multiprocessing.get_context("spawn")
+		self.conn, child = ctx.Pipe()
+		self.process = ctx.Process(target=team_worker_main, args=(child, name, seed, memory_limit), daemon=True)
+		self.process.start()
+		child.close()
+
+	# 地图只发送一次，之后不随控制器传输
+	def set_map(self, gmap: Map) -> None:
+		self.pending.append(("map", gmap))
+		self.flush()
+
+	def spawn(self, rid: int) -> None:
+		self.pending.append(("spawn", rid))
+
+	def drop(self, rid: int) -> None:
+		self.pending.append(("drop", rid))
+
+	def _send(self, request: Optional[tuple]) -> None:
+		if request is not None and request[0] == "run":
+			setattr(request[2], "_Controller__map", None)
+		data = pickle.dumps((self.seq, self.pending, request), pickle.HIGHEST_PROTOCOL)
+		self.pending = []
+		self.conn.send_bytes(data)
+
+	def _dead(self, message: str) -> TeamError:
+		self.alive = False
+		if self.process.is_alive():
+			self.process.kill()
+		return TeamError(message)
+
+	# 发送请求并等待回复
+	def _call(self, request: tuple) -> object:
+		if not self.alive:
+			raise TeamError("队伍进程已经退出。")
+		self.seq += 1
+		try:
+			self._send(request)
+			while True:
+				with player_code():  # 只在等待回复时可以被时间预算打断，收发消息时不会
+					ready = self.conn.poll(self.timeout)
+				if not ready:
+					raise self._dead("队伍进程失去响应。")
+				seq, status, result = pickle.loads(self.conn.recv_bytes())
+				if seq == self.seq:  # 丢弃被打断的请求的回复
+					break
+		except (EOFError, OSError):
+			raise self._dead("队伍进程已经退出。")
+		if status == "error":
+			raise TeamError(result[0], result[1])
+		return result
+
+	def run(self, rid: int, controller: Controller) -> Tuple[EntityInfo, float, List[list]]:
+		return self._call(("run", rid, controller))
+
+	def get_state(self) -> dict:
+		return self._call(("state",))
+
+	def set_state(self, state: dict) -> None:
+		self.pending.append(("restore", state))
+		self.flush()
+
+	# 将缓存的操作发送给队伍进程
+	def flush(self) -> None:
+		if self.alive and self.pending:
+			try:
+				self._send(None)
+			except OSError:
+				self._dead("队伍进程已经退出。")
+
+	def close(self) -> None:
+		if self.alive:
+			try:
+				self._send(("stop",))
+			except OSError:
+				pass
+			self.process.join(1)
+		if self.process.is_alive():
+			self.process.kill()
+		self.alive = False
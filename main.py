@@ -6,6 +6,7 @@ import random
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from core.game import Instance
+from core.replay import REPLAY_EXTENSIONS
 
 
 def main():
@@ -16,13 +17,30 @@ def main():
             players = config['players']
             rounds = config['rounds']
             debug = config['debug']
+            replay_format = config.get('replay_format', 'json')
+            profile = config.get('profile', False)
+            turn_time_limit = config.get('turn_time_limit')
+            team_time_limit = config.get('team_time_limit')
+            team_workers = config.get('team_workers', False)
+            worker_memory_limit = config.get('worker_memory_limit')
+            worker_timeout = config.get('worker_timeout')
+            entity_table = config.get('entity_table', False)
+            checkpoint_interval = config.get('checkpoint_interval')
+            resume = config.get('resume')
+
+            if resume:  # 从检查点继续之前的比赛
+                Instance.resume(resume).run()
+                return
 
             if debug:
                 random.seed(0)
             random.shuffle(players)
-            game = Instance(players, map_file, rounds, debug)
+            game = Instance(players, map_file, rounds, debug, replay_format=replay_format, profile=bool(profile), profile_in_replay=profile == 'replay',
+                            turn_time_limit=turn_time_limit, team_time_limit=team_time_limit, team_workers=team_workers,
+                            worker_memory_limit=worker_memory_limit * 1024 * 1024 if worker_memory_limit is not None else None, worker_timeout=worker_timeout,
+                            entity_table=entity_table, checkpoint_interval=checkpoint_interval)
             if debug:
-                game.replay_path = "./replays/replays-debug.rpl"
+                game.replay_path = "./replays/replays-debug.{}".format(REPLAY_EXTENSIONS[replay_format])
             game.run()
     except FileNotFoundError:
         print('未找到配置文件。')
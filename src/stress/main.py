@@ -0,0 +1,47 @@
+import random
+
+from src import template
+from core.api import *
+
+
+# 压力测试用的队伍。星球尽可能快地建造舰船，其余实体每回合都会感知周围并移动
+class Player(template.Player):
+	def __init__(self):
+		super().__init__()
+
+	def random_move(self):
+		dirs = Direction.all_directions()
+		random.shuffle(dirs)
+		for d in dirs:
+			if self.controller.can_move(d):
+				self.controller.move(d)
+				return
+
+	def run_planet(self):
+		if self.controller.get_energy() <= 0:
+			return
+		t = random.choice([EntityType("destroyer"), EntityType("miner"), EntityType("scout")])
+		e = random.randint(1, min(self.controller.get_energy(), 30))
+		for d in Direction.all_directions():
+			if self.controller.can_build(t, d, e):
+				self.controller.build(t, d, e)
+				return
+
+	def run_destroyer(self):
+		radius = self.controller.get_type().action_radius
+		enemies = self.controller.sense_nearby_entities(radius=radius, teams=self.controller.get_opponent())
+		if len(enemies) >= 3 and self.controller.can_overdrive(radius):
+			self.controller.overdrive(radius)
+			return
+		self.random_move()
+
+	def run_miner(self):
+		self.controller.sense_nearby_entities()
+		self.random_move()
+
+	def run_scout(self):
+		for entity in self.controller.sense_nearby_entities(teams=self.controller.get_opponent()):
+			if entity.type == "miner" and self.controller.can_analyze(entity.ID):
+				self.controller.analyze(entity.ID)
+				return
+		self.random_move()
@@ -0,0 +1,44 @@
+import os
+import sys
+import json
+import time
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from core.tournament import Tournament
+
+
+def main():
+    config_path = sys.argv[1] if len(sys.argv) > 1 else './tournament.json'
+    try:
+        with open(config_path, "r", encoding="utf-8") as f:
+            config = json.loads(f.read())
+    except FileNotFoundError:
+        print('未找到配置文件。')
+        return
+
+    tournament = Tournament(
+        config['roster'],
+        config['maps'],
+        config['seeds'],
+        config.get('format', 'round_robin'),
+        config.get('rounds', 1000),
+        processes=config.get('processes'),
+        timeout=config.get('timeout', 600),
+        challenger=config.get('challenger'),
+        swiss_rounds=config.get('swiss_rounds'),
+    )
+    summary = tournament.run()
+
+    output = config.get('output', './results/tournament-{}.json'.format(int(time.time())))
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        f.write(json.dumps(summary, indent=1))
+
+    for rank, entry in enumerate(summary['standings']):
+        print("{}. {} {:.1f}".format(rank + 1, entry['team'], entry['points']))
+    print("结果已保存至：{}".format(output))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,172 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import tempfile
+import multiprocessing
+from multiprocessing.connection import Connection
+from typing import Optional
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+	import resource
+except ImportError:  # Windows下没有resource模块，不统计内存峰值
+	resource = None
+
+# 基准测试场景。stress队伍会尽可能多地建造舰船，noact队伍作为空载的对照
+SCENARIOS = [
+	{"name": "maptestsmall-idle", "map": "maptestsmall", "teams": ["noact", "noact"]},
+	{"name": "maptestsmall-stress", "map": "maptestsmall", "teams": ["stress", "stress"]},
+	{"name": "maptestbigrect-stress", "map": "maptestbigrect", "teams": ["stress", "stress"]},
+	{"name": "huge_square_x64-stress", "map": "huge_square_x64", "teams": ["stress", "stress"]},
+	{"name": "multi_square_x100_4-idle", "map": "multi_square_x100_4", "teams": ["noact"] * 4},
+	{"name": "multi_square_x100_4-stress", "map": "multi_square_x100_4", "teams": ["stress"] * 4},
+]
+PHASES = ["setup", "planet_income", "run_entities", "end_round_check", "new_replay"]
+
+
+def peak_rss() -> Optional[int]:
+	if resource is None:
+		return None
+	rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+	return rss if sys.platform == "darwin" else rss * 1024  # Linux下单位为KB
+
+
+# 在子进程中运行一个场景，以便单独统计内存峰值
+def run_scenario(scenario: dict, rounds: int, seed: int, conn: Connection) -> None:
+	from core.game import Instance
+
+	# 记录每个阶段耗时的比赛实例
+	class BenchmarkInstance(Instance):
+		def __init__(self, *args, **kwargs):
+			self.phase_time = {phase: 0.0 for phase in PHASES}
+			self.entity_turns = 0
+			super().__init__(*args, **kwargs)
+
+		def planet_income(self):
+			start = time.perf_counter()
+			super().planet_income()
+			self.phase_time["planet_income"] += time.perf_counter() - start
+
+		def run_entities(self):
+			start = time.perf_counter()
+			super().run_entities()
+			self.phase_time["run_entities"] += time.perf_counter() - start
+
+		def run_instance(self, entity_id):
+			self.entity_turns += 1
+			super().run_instance(entity_id)
+
+		def end_round_check(self):
+			start = time.perf_counter()
+			super().end_round_check()
+			self.phase_time["end_round_check"] += time.perf_counter() - start
+
+		def new_replay(self):
+			start = time.perf_counter()
+			super().new_replay()
+			self.phase_time["new_replay"] += time.perf_counter() - start
+
+	with tempfile.TemporaryDirectory() as replay_dir:
+		random.seed(seed)
+		start = time.perf_counter()
+		game = BenchmarkInstance(list(scenario["teams"]), "./maps/{}.json".format(scenario["map"]), rounds, False, False)
+		game.phase_time["setup"] = time.perf_counter() - start
+		game.replay_path = os.path.join(replay_dir, "benchmark.rpl")
+
+		start = time.perf_counter()
+		game.new_replay()
+		initial_replay = game.phase_time["new_replay"]  # 开始前写入的回合不在end_round_check中
+		max_entities = 0
+		while game.round < rounds and not game.game_end_flag:
+			game.next_round()
+			max_entities = max(max_entities, len(game.available_entities_ids))
+		total = time.perf_counter() - start
+		if not game.game_end_flag:  # 提前结束的比赛已经在end_game中关闭了回放
+			game.replay_writer.close()
+
+	game.phase_time["end_round_check"] -= game.phase_time["new_replay"] - initial_replay  # 回放单独统计
+	conn.send({
+		"name": scenario["name"],
+		"status": "ok",
+		"map": scenario["map"],
+		"teams": scenario["teams"],
+		"rounds": game.round,
+		"entity_turns": game.entity_turns,
+		"max_entities": max_entities,
+		"time": total,
+		"rounds_per_sec": game.round / total if total > 0 else 0,
+		"entity_turns_per_sec": game.entity_turns / total if total > 0 else 0,
+		"phases": game.phase_time,
+		"peak_rss": peak_rss(),
+	})
+	conn.close()
+
+
+def run_benchmark(scenarios: list, rounds: int, seed: int) -> list:
+	ctx = multiprocessing.get_context("spawn")
+	results = []
+	for scenario in scenarios:  # 依次运行，避免场景之间相互干扰
+		receiver, sender = ctx.Pipe(duplex=False)
+		process = ctx.Process(target=run_scenario, args=(scenario, rounds, seed, sender))
+		process.start()
+		sender.close()
+		try:
+			result = receiver.recv()
+		except EOFError:  # 场景进程崩溃，例如内存不足
+			result = None
+		process.join()
+		if result is None:
+			results.append({"name": scenario["name"], "map": scenario["map"], "teams": scenario["teams"], "status": "crash", "exitcode": process.exitcode})
+			print("{:<28} 进程异常退出，退出码 {}".format(scenario["name"], process.exitcode))
+			continue
+		results.append(result)
+		print("{:<28} {:>5} 回合 {:>8.2f} 回合/秒 {:>10.0f} 实体回合/秒 {:>7} 最多实体".format(
+			result["name"], result["rounds"], result["rounds_per_sec"], result["entity_turns_per_sec"], result["max_entities"]))
+	return results
+
+
+def compare(results: list, baseline: dict) -> None:
+	base = {r["name"]: r for r in baseline["scenarios"]}
+	print("========\n与基准的对比（回合/秒，越大越好）：")
+	for r in results:
+		if r["status"] != "ok" or base.get(r["name"], {}).get("rounds_per_sec", 0) == 0:
+			continue
+		ratio = r["rounds_per_sec"] / base[r["name"]]["rounds_per_sec"]
+		print("{:<28} {:>8.2f} -> {:>8.2f} ({:+.1f}%)".format(r["name"], base[r["name"]]["rounds_per_sec"], r["rounds_per_sec"], (ratio - 1) * 100))
+
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description="引擎基准测试")
+	parser.add_argument("--rounds", type=int, default=200, help="每个场景运行的回合数")
+	parser.add_argument("--seed", type=int, default=0, help="随机种子")
+	parser.add_argument("--scenario", action="append", help="只运行指定名称的场景，可以重复")
+	parser.add_argument("--output", default="./benchmarks/benchmark-{}.json".format(int(time.time())), help="结果文件的位置")
+	parser.add_argument("--baseline", help="用于对比的基准结果文件")
+	args = parser.parse_args()
+
+	os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+	scenarios = [s for s in SCENARIOS if args.scenario is None or s["name"] in args.scenario]
+	results = run_benchmark(scenarios, args.rounds, args.seed)
+	report = {
+		"timestamp": int(time.time()),
+		"python": platform.python_version(),
+		"platform": platform.platform(),
+		"rounds": args.rounds,
+		"seed": args.seed,
+		"scenarios": results,
+	}
+	directory = os.path.dirname(args.output)
+	if directory:
+		os.makedirs(directory, exist_ok=True)
+	with open(args.output, "w", encoding="utf-8") as f:
+		f.write(json.dumps(report, indent=1))
+	print("结果已保存至：{}".format(args.output))
+
+	if args.baseline:
+		with open(args.baseline, "r", encoding="utf-8") as f:
+			compare(results, json.loads(f.read()))
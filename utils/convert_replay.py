@@ -0,0 +1,31 @@
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.replay import convert_replay
+
+
+# 将json回放（.rpl）转换为增量回放（.rpd）。参数可以是文件或者文件夹
+if __name__ == '__main__':
+	if len(sys.argv) < 2:
+		print("用法：python utils/convert_replay.py <回放文件或文件夹>... [--keyframe N]")
+		sys.exit(1)
+	args = sys.argv[1:]
+	keyframe = 50
+	if "--keyframe" in args:
+		i = args.index("--keyframe")
+		keyframe = int(args[i + 1])
+		del args[i:i + 2]
+
+	sources = []
+	for arg in args:
+		if os.path.isdir(arg):
+			sources.extend(os.path.join(arg, name) for name in sorted(os.listdir(arg)) if name.endswith(".rpl"))
+		else:
+			sources.append(arg)
+
+	for source in sources:
+		target = os.path.splitext(source)[0] + ".rpd"
+		convert_replay(source, target, keyframe)
+		print("{} -> {} ({:.1f}%)".format(source, target, 100 * os.path.getsize(target) / os.path.getsize(source)))
@@ -1,15 +1,22 @@
-import random
+import os
+import sys
 import json
+import math
+import random
+import argparse
+from array import array
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-def randomize_aether(x, y):
-	result = []
-	for i in range(x):
-		for j in range(y // 2):
-			aether = random.uniform(0.2, 1.0)
-			result.append({"x": i, "y": j, "aether": aether})
-			result.append({"x": i, "y": y - j - 1, "aether": aether})
-	return result
+from core.mapcache import cache_path, write_cache
+
+# 地图生成器。以太密度由带种子的多层值噪声生成，再按对称方式复制到整张地图；星球按对称的轨道放置，
+# 并检查各队伍到其他星球的距离是否一致。地图边生成边写入文件，可以同时写入编译后的.cmap缓存。
+# 对称方式：mirror_x、mirror_y（左右或上下镜像，2人）、mirror_xy（双向镜像，4人）、rotate（绕中心旋转，2~8人）。
+# 旋转对称在2人以及正方形地图的4人时是精确的。其余人数只支持正方形地图：每个格子的对称位置是精确旋转后取整的格子，
+# 与精确位置的距离不超过√2/2格（星球之间的距离相差不超过√2格）。取整后出界或者与其他格子重合的格子不作为星球的位置，
+# 星球可能出现的格子上以太密度完全对称，其余的格子（约三到五成）按极坐标折叠取值，只是近似对称。
+SYMMETRIES = {"mirror_x": (2,), "mirror_y": (2,), "mirror_xy": (4,), "rotate": tuple(range(2, 9))}
 
 
 def gen_planet(x, y, team, res=150):
@@ -19,13 +26,232 @@ def gen_planet(x, y, team, res=150):
 		return {"x": x, "y": y, "team": str(team), "energy": 150}
 
 
+# 一层值噪声。在间隔为scale的格点上取随机值，格点之间平滑插值，结果按x优先排列
+def value_noise(width, height, scale, rng):
+	columns = width // scale + 2
+	rows = height // scale + 2
+	lattice = [[rng.random() for _ in range(rows)] for _ in range(columns)]
+	weights = []  # 每一行对应的格点与插值权重
+	for y in range(height):
+		t = (y % scale) / scale
+		weights.append((y // scale, t * t * (3 - 2 * t)))
+	noise = array("d")
+	for x in range(width):
+		t = (x % scale) / scale
+		t = t * t * (3 - 2 * t)
+		left, right = lattice[x // scale], lattice[x // scale + 1]
+		column = [a + (b - a) * t for a, b in zip(left, right)]  # 先在x方向插值
+		noise.extend([column[j] + (column[j + 1] - column[j]) * s for j, s in weights])
+	return noise
+
+
+# 多层噪声叠加，每层的尺度减半、权重减半，结果归一化到[0, 1]
+def fractal_noise(width, height, scale, octaves, rng):
+	field = array("d", bytes(8 * width * height))
+	amplitude = 1.0
+	for _ in range(octaves):
+		layer = value_noise(width, height, max(1, scale), rng)
+		for i, value in enumerate(layer):
+			field[i] += value * amplitude
+		scale //= 2
+		amplitude /= 2
+	low, high = min(field), max(field)
+	span = (high - low) or 1.0
+	return array("d", ((value - low) / span for value in field))
+
+
+# 点(x, y)在各个队伍视角下的对应位置，第k项属于第k个队伍
+def images(x, y, width, height, symmetry, players):
+	if symmetry == "mirror_x":
+		return [(x, y), (width - 1 - x, y)]
+	if symmetry == "mirror_y":
+		return [(x, y), (x, height - 1 - y)]
+	if symmetry == "mirror_xy":
+		return [(x, y), (width - 1 - x, y), (width - 1 - x, height - 1 - y), (x, height - 1 - y)]
+	cx, cy = (width - 1) / 2, (height - 1) / 2
+	if players == 2:
+		return [(x, y), (width - 1 - x, height - 1 - y)]
+	if players == 4 and width == height:
+		return [(x, y), (width - 1 - y, x), (width - 1 - x, height - 1 - y), (y, height - 1 - x)]
+	result = []
+	for k in range(players):
+		angle = 2 * math.pi * k / players
+		dx, dy = x - cx, y - cy
+		result.append((round(cx + dx * math.cos(angle) - dy * math.sin(angle)), round(cy + dx * math.sin(angle) + dy * math.cos(angle))))
+	return result
+
+
+def is_exact(width, height, symmetry, players):
+	return symmetry != "rotate" or players == 2 or (players == 4 and width == height)
+
+
+# 近似旋转对称下每个格子所属的轨道。基本区域中的格子按到中心的距离依次取images()作为轨道，
+# 出界或者与之前的轨道重合的轨道被舍弃。结果为轨道在基本区域中的格子，不在任何轨道上时为-1
+_owners = {}
+
+
+def rotation_owners(width, height, players):
+	key = (width, height, players)
+	if key not in _owners:
+		owner = array("q", [-1]) * (width * height)
+		cx, cy = (width - 1) / 2, (height - 1) / 2
+		wedge = 2 * math.pi / players
+		cells = [(x, y) for x in range(width) for y in range(height) if math.atan2(y - cy, x - cx) % (2 * math.pi) < wedge]
+		cells.sort(key=lambda cell: (cell[0] - cx) ** 2 + (cell[1] - cy) ** 2)
+		for x, y in cells:
+			orbit = [ix * height + iy for ix, iy in images(x, y, width, height, "rotate", players) if 0 <= ix < width and 0 <= iy < height]
+			if len(set(orbit)) == players and all(owner[i] == -1 for i in orbit):
+				for i in orbit:
+					owner[i] = x * height + y
+		_owners[key] = owner
+	return _owners[key]
+
+
+# 每个格子在基本区域中对应的格子。对称位置上的格子取同一个值，从而保证以太密度对称
+def source_cells(width, height, symmetry, players):
+	source = array("q", bytes(8 * width * height))
+	exact = is_exact(width, height, symmetry, players)
+	if not exact and width != height:
+		raise Exception("近似的旋转对称只支持正方形地图。")
+	owner = None if exact else rotation_owners(width, height, players)
+	cx, cy = (width - 1) / 2, (height - 1) / 2
+	wedge = 2 * math.pi / players
+	for x in range(width):
+		for y in range(height):
+			if exact:
+				sx, sy = min(images(x, y, width, height, symmetry, players))
+			elif owner[x * height + y] != -1:
+				sx, sy = divmod(owner[x * height + y], height)
+			else:  # 不在任何轨道上的格子
+				dx, dy = x - cx, y - cy
+				r = math.hypot(dx, dy)
+				angle = math.atan2(dy, dx) % wedge
+				sx = min(max(round(cx + r * math.cos(angle)), 0), width - 1)
+				sy = min(max(round(cy + r * math.sin(angle)), 0), height - 1)
+			source[x * height + y] = sx * height + sy
+	return source
+
+
+def generate_aether(width, height, symmetry, players, rng, scale=16, octaves=3, low=0.2, high=1.0):
+	noise = fractal_noise(width, height, scale, octaves, rng)
+	source = source_cells(width, height, symmetry, players)
+	return array("d", (low + (high - low) * noise[i] for i in source))
+
+
+# 某个位置附近以太密度的平均值
+def local_aether(aether, width, height, x, y, radius):
+	total = 0.0
+	count = 0
+	for i in range(max(0, x - radius), min(width, x + radius + 1)):
+		for j in range(max(0, y - radius), min(height, y + radius + 1)):
+			total += aether[i * height + j]
+			count += 1
+	return total / count
+
+
+# 各队伍的距离轮廓：本队母星到所有其他星球的距离，排序后比较
+def _fair(homes, planets, tolerance):
+	profiles = []
+	for hx, hy in homes:
+		profiles.append(sorted(math.hypot(hx - x, hy - y) for x, y in planets if (x, y) != (hx, hy)))
+	return all(abs(a - b) <= tolerance for profile in profiles[1:] for a, b in zip(profiles[0], profile))
+
+
+# 按对称的轨道放置星球。orbits为中立星球的轨道数，每条轨道为每个队伍放置一个中立星球
+def place_planets(aether, width, height, symmetry, players, rng, orbits=4, energy=(100, 400), min_gap=None, attempts=2000):
+	exact = is_exact(width, height, symmetry, players)
+	tolerance = 1e-9 if exact else 1.5  # 近似的旋转对称允许取整带来的误差
+	owner = None if exact else rotation_owners(width, height, players)
+	min_gap = min_gap or max(3, min(width, height) // 12)
+	home_distance = min(width, height) * 0.35
+	radius = max(2, min(width, height) // 20)
+
+	# 随机选择一组对称位置。近似旋转对称时只从完整的轨道中选择，不在轨道上时返回None
+	def sample():
+		x, y = rng.randrange(width), rng.randrange(height)
+		if not exact:
+			if owner[x * height + y] == -1:
+				return None
+			x, y = divmod(owner[x * height + y], height)
+		return images(x, y, width, height, symmetry, players)
+
+	def valid(points, placed):
+		if points is None or len(set(points)) != len(points):
+			return False
+		for x, y in points:
+			if not (0 <= x < width and 0 <= y < height):
+				return False
+			if any(math.hypot(x - px, y - py) < min_gap for px, py in placed):
+				return False
+		return True
+
+	for _ in range(attempts):
+		homes = sample()
+		if not valid(homes, []):
+			continue
+		if min(math.hypot(a[0] - b[0], a[1] - b[1]) for i, a in enumerate(homes) for b in homes[i + 1:]) < home_distance:
+			continue
+		densities = [local_aether(aether, width, height, x, y, radius) for x, y in homes]
+		if max(densities) - min(densities) > 0.05:
+			continue
+		break
+	else:
+		raise Exception("无法放置母星，请增大地图或者减少玩家数。")
+
+	placed = list(homes)
+	planets = [gen_planet(x, y, k) for k, (x, y) in enumerate(homes)]
+	for _ in range(orbits):
+		for _ in range(attempts):
+			points = sample()
+			if valid(points, placed) and _fair(homes, placed + points, tolerance):
+				break
+		else:
+			raise Exception("无法放置中立星球，请增大地图或者减少轨道数。")
+		res = rng.randint(*energy)
+		placed.extend(points)
+		planets.extend(gen_planet(x, y, "Neutral", res) for x, y in points)
+	return planets
+
+
+# 逐列写入地图json，不需要一次性构造所有格子的字典
+def write_map(path, players, width, height, planets, aether):
+	with open(path, "w", encoding="utf-8") as f:
+		f.write('{"players": ' + json.dumps(players) + ', "map_size": ' + json.dumps([width, height]) + ', "planets": ' + json.dumps(planets) + ', "map": [')
+		for x in range(width):
+			base = x * height
+			cells = ", ".join('{"x": %d, "y": %d, "aether": %r}' % (x, y, aether[base + y]) for y in range(height))
+			f.write(cells if x == 0 else ", " + cells)
+		f.write("]}")
+
+
 if __name__ == '__main__':
-	map_name = "multi_square_x100_4"
-	x = 100
-	y = 100
-	planets = [gen_planet(0, 0, "Neutral"), gen_planet(99, 99, "Neutral"), gen_planet(99, 0, "Neutral"), gen_planet(0, 99, "Neutral"), gen_planet(35, 35, 0), gen_planet(63, 63, 1), gen_planet(35, 63, 2), gen_planet(63, 35, 3)]
-	tmap = randomize_aether(x, y)
-
-	f = open("./maps/{}.json".format(map_name), "w", encoding="utf-8")
-	f.write(json.dumps({"players": 4, "map_size": (x, y), "map": tmap, "planets": planets}))
-	f.close()
+	parser = argparse.ArgumentParser(description="地图生成器")
+	parser.add_argument("name", help="地图名，保存为maps/<地图名>.json")
+	parser.add_argument("--size", type=int, nargs=2, default=[100, 100], metavar=("WIDTH", "HEIGHT"))
+	parser.add_argument("--players", type=int, default=2)
+	parser.add_argument("--symmetry", choices=list(SYMMETRIES), default="mirror_y")
+	parser.add_argument("--seed", type=int, help="随机种子，相同的参数与种子生成相同的地图")
+	parser.add_argument("--orbits", type=int, default=4, help="中立星球的轨道数，每条轨道为每个队伍放置一个中立星球")
+	parser.add_argument("--scale", type=int, default=16, help="噪声最大一层的尺度（格）")
+	parser.add_argument("--octaves", type=int, default=3, help="噪声的层数")
+	parser.add_argument("--aether", type=float, nargs=2, default=[0.2, 1.0], metavar=("LOW", "HIGH"), help="以太密度的范围")
+	parser.add_argument("--cmap", action="store_true", help="同时写入编译后的.cmap缓存，引擎不再需要解析json")
+	parser.add_argument("--output-dir", default="./maps")
+	args = parser.parse_args()
+
+	if args.players not in SYMMETRIES[args.symmetry]:
+		parser.error("{}对称不支持{}人。".format(args.symmetry, args.players))
+	width, height = args.size
+	if not is_exact(width, height, args.symmetry, args.players) and width != height:
+		parser.error("{}人的旋转对称只支持正方形地图。".format(args.players))
+	rng = random.Random(args.seed)
+	aether = generate_aether(width, height, args.symmetry, args.players, rng, args.scale, args.octaves, *args.aether)
+	planets = place_planets(aether, width, height, args.symmetry, args.players, rng, args.orbits)
+
+	path = os.path.join(args.output_dir, "{}.json".format(args.name))
+	os.makedirs(args.output_dir, exist_ok=True)
+	write_map(path, args.players, width, height, planets, aether)
+	if args.cmap:
+		stat = os.stat(path)
+		write_cache(cache_path(path), args.players, [width, height], planets, aether, (stat.st_size, stat.st_mtime_ns))
+	print("地图已保存至：{}".format(path))
@@ -0,0 +1,31 @@
+import os
+import sys
+import json
+import argparse
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.analytics import analyze_replays, report
+
+
+# 统计目录下所有回放的胜利原因、胜率、行动次数、种类构成与能量曲线。已经统计过的回放会被缓存
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description="批量回放统计")
+	parser.add_argument("directory", nargs="?", default="./replays", help="回放所在的文件夹，包括子文件夹")
+	parser.add_argument("--bucket", type=int, default=10, help="曲线中每个点包含的回合数")
+	parser.add_argument("--processes", type=int, help="并行的进程数，默认为CPU核心数，0表示不使用子进程")
+	parser.add_argument("--no-cache", action="store_true", help="不读取也不保存缓存")
+	parser.add_argument("--output", help="结果文件的位置，默认输出到屏幕")
+	args = parser.parse_args()
+
+	summary = analyze_replays(args.directory, args.bucket, args.processes, None if args.no_cache else "", progress=args.output is not None)
+	result = json.dumps(report(summary), indent=1, ensure_ascii=False)
+	if args.output is None:
+		print(result)
+	else:
+		directory = os.path.dirname(args.output)
+		if directory:
+			os.makedirs(directory, exist_ok=True)
+		with open(args.output, "w", encoding="utf-8") as f:
+			f.write(result)
+		print("结果已保存至：{}".format(args.output))